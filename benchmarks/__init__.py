@@ -0,0 +1,12 @@
+"""Performance benchmarks for mineLogger.
+
+Run from the repository root::
+
+    python -m benchmarks run                      # results in benchmarks/results/
+    python -m benchmarks run --compare old.json   # flag regressions
+    python -m benchmarks generate big.db --years 20
+
+Every run builds a throwaway database from ``data.generate_entries`` in a
+temporary directory, so ``~/.minelogger`` is never touched, and talks to a
+local Ollama stub instead of a real model.
+"""
@@ -0,0 +1,106 @@
+"""Command line for the benchmark suite: ``python -m benchmarks --help``."""
+import json
+import platform
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import click
+
+from . import data, suite
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+@click.group()
+def main():
+    """mineLogger benchmarks."""
+
+
+@main.command(name="run")
+@click.option("--customers", default=100, show_default=True, help="Number of customers")
+@click.option("--years", default=10, show_default=True, help="Years of history")
+@click.option("--entries-per-day", default=8, show_default=True,
+              help="Average entries per weekday")
+@click.option("--seed", default=1, show_default=True, help="Random seed for the data")
+@click.option("--repeat", default=5, show_default=True, help="Timed rounds per benchmark")
+@click.option("--only", default=None, help="Run only benchmarks whose name contains this")
+@click.option("--stub-latency", default=0.0, show_default=True,
+              help="Seconds the Ollama stub waits before answering")
+@click.option("--output", type=click.Path(dir_okay=False), default=None,
+              help="Results file [default: benchmarks/results/<timestamp>.json]")
+@click.option("--compare", "baseline", type=click.File("r"), default=None,
+              help="Earlier results file to compare against")
+@click.option("--threshold", default=0.10, show_default=True,
+              help="Slowdown (as a fraction) reported as a regression")
+def run_command(customers, years, entries_per_day, seed, repeat, only, stub_latency,
+                output, baseline, threshold):
+    """Generate a throwaway database and run the benchmarks."""
+    click.echo(f"Generating {years} years for {customers} customers…")
+
+    def progress(name, result):
+        click.echo(f"  {name:<48} {result['median'] * 1000:>10.3f} ms")
+
+    report = suite.run(
+        repeat=repeat, only=only, customers=customers, years=years,
+        entries_per_day=entries_per_day, seed=seed, stub_latency=stub_latency,
+        progress=progress,
+    )
+    report["created_at"] = datetime.now().isoformat(timespec="seconds")
+    report["python"] = platform.python_version()
+    report["sqlite"] = sqlite3.sqlite_version
+    report["platform"] = platform.platform()
+
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / (datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    Path(output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    click.echo(f"{report['entries']} entries; results written to {output}")
+
+    if baseline is not None:
+        regressions = _print_comparison(json.load(baseline), report, threshold)
+        if regressions:
+            sys.exit(1)
+
+
+@main.command()
+@click.argument("baseline", type=click.File("r"))
+@click.argument("current", type=click.File("r"))
+@click.option("--threshold", default=0.10, show_default=True,
+              help="Slowdown (as a fraction) reported as a regression")
+def compare(baseline, current, threshold):
+    """Compare two results files. Exits with status 1 on regressions."""
+    if _print_comparison(json.load(baseline), json.load(current), threshold):
+        sys.exit(1)
+
+
+@main.command()
+@click.argument("path", type=click.Path(dir_okay=False))
+@click.option("--customers", default=100, show_default=True, help="Number of customers")
+@click.option("--years", default=10, show_default=True, help="Years of history")
+@click.option("--entries-per-day", default=8, show_default=True,
+              help="Average entries per weekday")
+@click.option("--seed", default=1, show_default=True, help="Random seed for the data")
+def generate(path, customers, years, entries_per_day, seed):
+    """Write a synthetic database to PATH, e.g. for trying the UI at scale."""
+    if Path(path).exists():
+        raise click.ClickException(f"{path} already exists.")
+    count = data.create_database(path, customers, years, entries_per_day, seed)
+    click.echo(f"Wrote {count} entries to {path}")
+
+
+def _print_comparison(baseline, current, threshold):
+    """Print old and new medians side by side. Returns the number of regressions."""
+    regressions = 0
+    for name, old, new, ratio, regressed in suite.compare(baseline, current, threshold):
+        flag = "  SLOWER" if regressed else ""
+        click.echo(f"{name:<48} {old * 1000:>10.3f} -> {new * 1000:>10.3f} ms  x{ratio:.2f}{flag}")
+        regressions += regressed
+    if baseline.get("params") != current.get("params"):
+        click.echo("Note: the runs used different data parameters.")
+    return regressions
+
+
+if __name__ == "__main__":
+    main()
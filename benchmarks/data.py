@@ -0,0 +1,102 @@
+"""Deterministic synthetic work-log data for benchmarks.
+
+Customers get Zipf-distributed shares of the work (a few big accounts and a
+long tail), and entry durations are Zipf-skewed towards short tasks, which
+is roughly what real time logs look like. The same arguments always give
+the same entries.
+"""
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+from minelogger import db
+
+# Durations in hours, most common first
+HOUR_VALUES = (1.0, 0.5, 2.0, 0.25, 1.5, 3.0, 4.0, 0.75, 6.0, 8.0)
+
+_PREFIXES = (
+    "Acme", "Northwind", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Tyrell",
+    "Cyberdyne", "Soylent", "Hooli", "Vandelay", "Wonka", "Oscorp", "Aperture", "Gringotts",
+)
+_SUFFIXES = (
+    "", "Traders", "Corp", "Labs", "Industries", "Systems", "Group", "Logistics",
+    "Health", "Energy", "Retail", "Bank",
+)
+_ACTIVITIES = (
+    "Standup", "Code review", "Bugfix", "Deploy", "Meeting", "Planning", "Migration",
+    "Support", "Documentation", "Testing", "Design", "Workshop", "Onboarding", "Audit",
+)
+_TOPICS = (
+    "login", "SSO", "billing", "reporting", "API", "database", "search", "backups",
+    "invoices", "dashboard", "mobile app", "CI pipeline", "permissions", "exports",
+)
+
+
+def zipf_weights(n, s=1.1):
+    """Weights proportional to 1 / rank**s for ranks 1..n."""
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def customer_names(count):
+    """Return ``count`` distinct, deterministic customer names."""
+    names = []
+    for i in range(count):
+        prefix = _PREFIXES[i % len(_PREFIXES)]
+        suffix = _SUFFIXES[(i // len(_PREFIXES)) % len(_SUFFIXES)]
+        name = f"{prefix} {suffix}".strip()
+        cycle = i // (len(_PREFIXES) * len(_SUFFIXES))
+        names.append(f"{name} {cycle + 1}" if cycle else name)
+    return names
+
+
+def generate_entries(customers=100, years=10, entries_per_day=8, seed=1,
+                     end=date(2025, 12, 31)):
+    """Yield entry dicts for every weekday in the ``years`` up to ``end``.
+
+    Each weekday gets between 1 and ``2 * entries_per_day - 1`` entries.
+    """
+    rng = random.Random(seed)
+    names = customer_names(customers)
+    customer_weights = zipf_weights(len(names))
+    hour_weights = zipf_weights(len(HOUR_VALUES), s=1.3)
+    activity_weights = zipf_weights(len(_ACTIVITIES), s=0.8)
+    topic_weights = zipf_weights(len(_TOPICS), s=0.8)
+
+    day = end - timedelta(days=365 * years)
+    ticket = 1000
+    while day <= end:
+        if day.weekday() < 5:
+            for _ in range(rng.randint(1, 2 * entries_per_day - 1)):
+                ticket += 1
+                activity = rng.choices(_ACTIVITIES, activity_weights)[0]
+                topic = rng.choices(_TOPICS, topic_weights)[0]
+                yield {
+                    "date": day.isoformat(),
+                    "customer": rng.choices(names, customer_weights)[0],
+                    "hours": rng.choices(HOUR_VALUES, hour_weights)[0],
+                    "description": f"{activity}: {topic} (#{ticket})",
+                    "created_at": f"{day.isoformat()}T17:00:00",
+                }
+        day += timedelta(days=1)
+
+
+def use_database(path):
+    """Point minelogger at the database file ``path`` and create its schema."""
+    db.close_connection()
+    db.DB_PATH = Path(path)
+    db.init_db()
+
+
+def create_database(path, customers=100, years=10, entries_per_day=8, seed=1, managed=20):
+    """Create a database at ``path`` filled with generated entries.
+
+    The ``managed`` largest customers are added to the customer preselection.
+    Returns the number of entries written.
+    """
+    use_database(path)
+    count = 0
+    for batch in db._batched(generate_entries(customers, years, entries_per_day, seed), 10000):
+        count += len(db.add_entries(batch))
+    for name in customer_names(customers)[:managed]:
+        db.add_customer(name)
+    return count
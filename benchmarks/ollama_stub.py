@@ -0,0 +1,69 @@
+"""A minimal local stand-in for the Ollama HTTP API.
+
+Answers /api/chat (streaming and not) with a fixed extraction after an
+optional delay, and /api/tags and /api/ps with the configured model, so
+``ollama.extract_entry`` can be measured without a model.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from minelogger import ollama
+
+RESPONSE = {
+    "date": "2025-12-30",
+    "customer": "Acme",
+    "hours": 1.5,
+    "description": "Reviewed the SSO migration plan",
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs
+    # add ~40 ms to every non-streaming response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._send_json({"models": [{"name": ollama.MODEL + ":latest", "model": ollama.MODEL}]})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.server.latency)
+        content = json.dumps(RESPONSE)
+        if not payload.get("stream"):
+            self._send_json({"message": {"role": "assistant", "content": content}, "done": True})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+        for i, piece in enumerate(pieces + [""]):
+            line = json.dumps({"message": {"content": piece}, "done": i == len(pieces)}) + "\n"
+            data = line.encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start(latency=0.0):
+    """Start the stub on a free local port. Returns the server; call shutdown() to stop."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,386 @@
+"""The benchmark definitions and a small timing harness."""
+import io
+import itertools
+import math
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from minelogger import db, ollama
+from minelogger.export import generate_csv, parse_csv
+
+from . import data, ollama_stub
+
+PAGE = 51  # the log's default page size plus the look-ahead row
+IMPORT_ROWS = 10000
+ROUTE_IMPORT_ROWS = 1000
+
+_BENCHMARKS = []
+
+
+def benchmark(name, setup=None):
+    """Register ``fn(ctx, *args)`` as a benchmark.
+
+    ``setup(ctx)``, if given, runs untimed before every round and returns
+    the arguments for that round.
+    """
+    def register(fn):
+        _BENCHMARKS.append((name, fn, setup))
+        return fn
+    return register
+
+
+def measure(fn, repeat=5, setup=None, min_time=0.01):
+    """Time ``fn`` and return statistics in seconds per call.
+
+    Calls faster than ``min_time`` are looped within each round so timer
+    resolution does not dominate; rounds with a setup always run once.
+    """
+    args = setup() if setup else ()
+    started = time.perf_counter()
+    fn(*args)  # warm-up, also used to pick the loop count
+    first = time.perf_counter() - started
+    number = 1 if setup or first >= min_time else max(1, math.ceil(min_time / max(first, 1e-7)))
+    samples = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        for _ in range(number):
+            fn(*args)
+        samples.append((time.perf_counter() - started) / number)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "rounds": repeat,
+        "number": number,
+    }
+
+
+class Context:
+    """Shared state for one run: the generated database, samples and a test client."""
+
+    def __init__(self, workdir, customers, years, entries_per_day, seed, stub_latency):
+        self.workdir = Path(workdir)
+        self.db_path = self.workdir / "bench.db"
+        self.params = {
+            "customers": customers, "years": years,
+            "entries_per_day": entries_per_day, "seed": seed,
+            "stub_latency": stub_latency,
+        }
+        started = time.perf_counter()
+        self.entry_count = data.create_database(self.db_path, customers, years, entries_per_day, seed)
+        self.generate_seconds = time.perf_counter() - started
+
+        names = data.customer_names(customers)
+        self.big_customer = names[0]
+        self.small_customer = names[-1]
+        months = [m["value"] for m in db.get_months()]
+        self.month = months[len(months) // 2]
+        self.month_from, self.month_to = self.month + "-01", self.month + "-31"
+
+        self.all_rows = list(db.iter_entries())
+        self.csv_text = generate_csv(self.all_rows)
+        self.import_rows = [e._asdict() for e in self.all_rows[:IMPORT_ROWS]]
+        self.import_csv = generate_csv(self.all_rows[:ROUTE_IMPORT_ROWS])
+        self._fresh = itertools.count()
+
+        from minelogger.server import create_app
+        self.client = create_app().test_client()
+
+        self.stub = ollama_stub.start(latency=stub_latency)
+        ollama.client.base_url = self.stub.url
+        self.chat_customers = db.get_managed_customers()
+
+    def fresh_database(self):
+        """Switch to a new, empty database file and return its path."""
+        path = self.workdir / f"empty-{next(self._fresh)}.db"
+        data.use_database(path)
+        return path
+
+    def restore_database(self):
+        data.use_database(self.db_path)
+
+    def close(self):
+        self.stub.shutdown()
+        ollama.client.base_url = ollama._BASE_URL
+        db.close_connection()
+
+
+# -- database functions ----------------------------------------------------
+
+def _filter_benchmark(date_range, customer):
+    label = " + ".join(part for part, on in (("date range", date_range), ("customer", customer)) if on)
+    name = f"db.get_entries page, {label or 'no filter'}"
+
+    @benchmark(name)
+    def run(ctx):
+        db.get_entries(
+            date_from=ctx.month_from if date_range else None,
+            date_to=ctx.month_to if date_range else None,
+            customer=ctx.big_customer if customer else None,
+            limit=PAGE,
+        )
+
+
+for _date_range, _customer in itertools.product((False, True), repeat=2):
+    _filter_benchmark(_date_range, _customer)
+
+
+@benchmark("db.get_entries page, date_from only")
+def _(ctx):
+    db.get_entries(date_from=ctx.month_from, limit=PAGE)
+
+
+@benchmark("db.get_entries page, date_to only")
+def _(ctx):
+    db.get_entries(date_to=ctx.month_to, limit=PAGE)
+
+
+@benchmark("db.get_entries page, rare customer")
+def _(ctx):
+    db.get_entries(customer=ctx.small_customer, limit=PAGE)
+
+
+@benchmark("db.get_entries all rows")
+def _(ctx):
+    db.get_entries()
+
+
+@benchmark("db.get_entries_total, customer")
+def _(ctx):
+    db.get_entries_total(customer=ctx.big_customer)
+
+
+@benchmark("db.get_monthly_summary")
+def _(ctx):
+    db.get_monthly_summary(ctx.month)
+
+
+@benchmark("db.get_months")
+def _(ctx):
+    db.get_months()
+
+
+@benchmark("db.get_customers")
+def _(ctx):
+    db.get_customers()
+
+
+def _cold_lookups(ctx):
+    db.clear_lookup_cache()
+    return ()
+
+
+@benchmark("db.get_customers, uncached", setup=_cold_lookups)
+def _(ctx):
+    db.get_customers()
+
+
+@benchmark("db.search_entries, common word")
+def _(ctx):
+    db.search_entries("review", limit=PAGE)
+
+
+@benchmark("db.search_entries, word + customer")
+def _(ctx):
+    db.search_entries("sso", customer=ctx.big_customer, limit=PAGE)
+
+
+@benchmark("db.import_entries, all duplicates")
+def _(ctx):
+    db.import_entries(ctx.import_rows)
+
+
+def _empty_database(ctx):
+    ctx.fresh_database()
+    return ()
+
+
+@benchmark(f"db.import_entries, {IMPORT_ROWS} new rows", setup=_empty_database)
+def _(ctx):
+    db.import_entries(ctx.import_rows)
+
+
+WRITE_THREADS = 8
+WRITES_PER_THREAD = 50
+
+
+def _concurrent_adds(ctx):
+    import threading
+
+    def work(n):
+        for i in range(WRITES_PER_THREAD):
+            db.add_entry("2025-12-31", ctx.big_customer, 1.0, f"Concurrent write {n}-{i}")
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(WRITE_THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+@benchmark(f"db.add_entry x{WRITES_PER_THREAD} from {WRITE_THREADS} threads", setup=_empty_database)
+def _(ctx):
+    _concurrent_adds(ctx)
+
+
+def _empty_database_with_writer(ctx):
+    db.stop_writer()
+    ctx.fresh_database()
+    db.start_writer()
+    return ()
+
+
+@benchmark(f"db.add_entry x{WRITES_PER_THREAD} from {WRITE_THREADS} threads, writer",
+           setup=_empty_database_with_writer)
+def _(ctx):
+    _concurrent_adds(ctx)
+
+
+# -- CSV -------------------------------------------------------------------
+
+@benchmark("export.generate_csv, all rows")
+def _(ctx):
+    generate_csv(ctx.all_rows)
+
+
+@benchmark("export.parse_csv, all rows")
+def _(ctx):
+    parse_csv(ctx.csv_text)
+
+
+# -- routes ----------------------------------------------------------------
+
+def _get(ctx, url, **kwargs):
+    response = ctx.client.get(url, **kwargs)
+    assert response.status_code in (200, 304), (url, response.status_code)
+    response.get_data()
+    return response
+
+
+@benchmark("GET /log")
+def _(ctx):
+    _get(ctx, "/log")
+
+
+@benchmark("GET /log, customer filter")
+def _(ctx):
+    _get(ctx, "/log", query_string={"customer": ctx.big_customer})
+
+
+@benchmark("GET /log, month summary")
+def _(ctx):
+    _get(ctx, "/log", query_string={"month": ctx.month})
+
+
+@benchmark("GET /log, search")
+def _(ctx):
+    _get(ctx, "/log", query_string={"q": "migration"})
+
+
+def _log_etag(ctx):
+    return (_get(ctx, "/log").headers["ETag"],)
+
+
+@benchmark("GET /log, not modified", setup=_log_etag)
+def _(ctx, etag):
+    _get(ctx, "/log", headers={"If-None-Match": etag})
+
+
+@benchmark("GET /export")
+def _(ctx):
+    _get(ctx, "/export")
+
+
+@benchmark("POST /export, all rows")
+def _(ctx):
+    ctx.client.post("/export", data={}).get_data()
+
+
+def _upload(text):
+    return {"csv_file": (io.BytesIO(text.encode("utf-8")), "import.csv")}
+
+
+@benchmark(f"POST /import, {ROUTE_IMPORT_ROWS} duplicates")
+def _(ctx):
+    ctx.client.post("/import", data=_upload(ctx.import_csv), content_type="multipart/form-data")
+
+
+def _empty_database_upload(ctx):
+    ctx.fresh_database()
+    return (_upload(ctx.import_csv),)
+
+
+@benchmark(f"POST /import, {ROUTE_IMPORT_ROWS} new rows", setup=_empty_database_upload)
+def _(ctx, upload):
+    ctx.client.post("/import", data=upload, content_type="multipart/form-data")
+
+
+# -- Ollama extraction ------------------------------------------------------
+
+_MODEL_MESSAGE = "spent the afternoon going over the SSO plan with acme"
+
+
+@benchmark("ollama.extract_entry, model (stub server)")
+def _(ctx):
+    ollama.extract_entry(_MODEL_MESSAGE, ctx.chat_customers, use_cache=False, fast_path=False)
+
+
+@benchmark("ollama.extract_entry, cache hit")
+def _(ctx):
+    ollama.extract_entry(_MODEL_MESSAGE, ctx.chat_customers, fast_path=False)
+
+
+@benchmark("ollama.extract_entry, local rules")
+def _(ctx):
+    ollama.extract_entry(f"2h SSO review with {ctx.big_customer} yesterday", ctx.chat_customers)
+
+
+@benchmark("ollama.stream_extract, model (stub server)")
+def _(ctx):
+    for _ in ollama.stream_extract(_MODEL_MESSAGE, ctx.chat_customers, use_cache=False,
+                                   fast_path=False):
+        pass
+
+
+def run(repeat=5, only=None, customers=100, years=10, entries_per_day=8, seed=1,
+        stub_latency=0.0, workdir=None, progress=None):
+    """Run the benchmarks whose names contain ``only`` (all if None).
+
+    The database is generated in ``workdir``, or in a temporary directory
+    that is removed afterwards. Returns the results as a JSON-ready dict.
+    """
+    with tempfile.TemporaryDirectory(prefix="minelogger-bench-") as tmp:
+        ctx = Context(workdir or tmp, customers, years, entries_per_day, seed, stub_latency)
+        results = {}
+        try:
+            for name, fn, setup in _BENCHMARKS:
+                if only and only.lower() not in name.lower():
+                    continue
+                round_setup = (lambda s=setup: s(ctx)) if setup else None
+                results[name] = measure(lambda *args, f=fn: f(ctx, *args), repeat, round_setup)
+                db.stop_writer()
+                ctx.restore_database()  # benchmarks with a setup may switch files
+                if progress:
+                    progress(name, results[name])
+        finally:
+            ctx.close()
+    return {
+        "params": ctx.params,
+        "entries": ctx.entry_count,
+        "generate_seconds": ctx.generate_seconds,
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.10):
+    """Yield (name, old median, new median, ratio, regressed) for benchmarks in both runs."""
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else float("inf")
+        yield name, old["median"], result["median"], ratio, ratio > 1 + threshold
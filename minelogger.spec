@@ -26,10 +26,14 @@ a = Analysis(
         "itsdangerous.timed",
         "blinker.base",
         "colorama",
+        "waitress",
+        "waitress.server",
         "minelogger.cli",
         "minelogger.server",
         "minelogger.db",
         "minelogger.export",
+        "minelogger.ollama",
+        "minelogger.rules",
     ],
     hookspath=[],
     hooksconfig={},
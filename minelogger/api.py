@@ -0,0 +1,203 @@
+"""Versioned JSON API for entries and customers, mounted at /api/v1.
+
+Bulk writes take a list of items and run in a single transaction: either
+every item is applied or, if any item is invalid or refers to a missing
+entry, none is. The response lists a result for each item by index.
+"""
+from flask import Blueprint, request, jsonify
+from . import db
+from .validation import ENTRY_FIELDS, validate_entry, format_cursor, parse_cursor
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_BULK_ITEMS = 1000
+
+_PUBLIC_FIELDS = ("id",) + ENTRY_FIELDS + ("created_at",)
+
+
+def _public(entry):
+    return {field: entry[field] for field in _PUBLIC_FIELDS}
+
+
+def _error(message, status=400, **extra):
+    return jsonify(error=message, **extra), status
+
+
+def _bulk_items(key):
+    """Return the list under ``key`` in the JSON body, or an error response."""
+    data = request.get_json(silent=True)
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, _error(f'Expected a JSON object with a non-empty "{key}" list.')
+    if len(items) > MAX_BULK_ITEMS:
+        return None, _error(f"At most {MAX_BULK_ITEMS} items per request.")
+    return items, None
+
+
+def _rejected(results):
+    """Response for a bulk request that was not applied because of some items."""
+    return _error("No changes were made; see the per-item results.", 422,
+                  applied=False, results=results)
+
+
+@api.route("/entries", methods=["GET"])
+def list_entries():
+    """List entries newest first, filtered like the log, a page at a time."""
+    limit = request.args.get("limit", DEFAULT_LIMIT, type=int)
+    if not 1 <= limit <= MAX_LIMIT:
+        return _error(f"limit must be between 1 and {MAX_LIMIT}.")
+    after = request.args.get("after")
+    cursor = parse_cursor(after)
+    if after and cursor is None:
+        return _error("Invalid cursor.")
+    entries = db.get_entries(
+        date_from=request.args.get("date_from") or None,
+        date_to=request.args.get("date_to") or None,
+        customer=request.args.get("customer") or None,
+        limit=limit + 1,
+        after=cursor,
+    )
+    next_cursor = format_cursor(entries[limit - 1]) if len(entries) > limit else None
+    return jsonify(entries=[_public(e) for e in entries[:limit]], next=next_cursor)
+
+
+@api.route("/entries/<int:entry_id>", methods=["GET"])
+def get_entry(entry_id):
+    entry = db.get_entry(entry_id)
+    if entry is None:
+        return _error("Entry not found.", 404)
+    return jsonify(_public(entry))
+
+
+@api.route("/entries", methods=["POST"])
+def create_entries():
+    """Create entries: {"entries": [{date, customer, hours, description}, ...]}."""
+    items, error = _bulk_items("entries")
+    if error:
+        return error
+    entries = []
+    results = []
+    for index, item in enumerate(items):
+        entry, errors = validate_entry(item if isinstance(item, dict) else {})
+        entries.append(entry)
+        if errors:
+            results.append({"index": index, "status": "invalid", "errors": errors})
+        else:
+            results.append({"index": index, "status": "ok"})
+    if any(r["status"] != "ok" for r in results):
+        return _rejected(results)
+    ids = db.add_entries(entries)
+    results = [{"index": i, "status": "created", "id": entry_id} for i, entry_id in enumerate(ids)]
+    return jsonify(applied=True, results=results), 201
+
+
+@api.route("/entries", methods=["PATCH"])
+def update_entries():
+    """Update entries: {"entries": [{"id": 1, "hours": 2}, ...]}.
+
+    Fields that are left out keep their current values.
+    """
+    items, error = _bulk_items("entries")
+    if error:
+        return error
+    ids = [item.get("id") if isinstance(item, dict) else None for item in items]
+    existing = db.get_entries_by_id(i for i in ids if isinstance(i, int))
+    rows = []
+    results = []
+    for index, (item, entry_id) in enumerate(zip(items, ids)):
+        if not isinstance(entry_id, int) or isinstance(entry_id, bool):
+            results.append({"index": index, "status": "invalid", "errors": ["id is required."]})
+            continue
+        current = existing.get(entry_id)
+        if current is None:
+            results.append({"index": index, "status": "not_found", "id": entry_id})
+            continue
+        merged = {field: item.get(field, current[field]) for field in ENTRY_FIELDS}
+        entry, errors = validate_entry(merged)
+        if errors:
+            results.append({"index": index, "status": "invalid", "id": entry_id, "errors": errors})
+            continue
+        entry["id"] = entry_id
+        rows.append(entry)
+        results.append({"index": index, "status": "ok", "id": entry_id})
+    if any(r["status"] != "ok" for r in results):
+        return _rejected(results)
+    missing = set(db.update_entries(rows))
+    if missing:
+        # Deleted between the lookup and the update
+        for r in results:
+            r["status"] = "not_found" if r["id"] in missing else "ok"
+        return _rejected(results)
+    for r in results:
+        r["status"] = "updated"
+    return jsonify(applied=True, results=results)
+
+
+@api.route("/entries", methods=["DELETE"])
+def delete_entries():
+    """Delete entries: {"ids": [1, 2, ...]}."""
+    ids, error = _bulk_items("ids")
+    if error:
+        return error
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return _error('"ids" must be a list of integers.')
+    missing = set(db.delete_entries(ids))
+    if missing:
+        results = [
+            {"index": index, "status": "not_found" if entry_id in missing else "ok", "id": entry_id}
+            for index, entry_id in enumerate(ids)
+        ]
+        return _rejected(results)
+    results = [{"index": index, "status": "deleted", "id": entry_id}
+               for index, entry_id in enumerate(ids)]
+    return jsonify(applied=True, results=results)
+
+
+@api.route("/customers", methods=["GET"])
+def list_customers():
+    """All customer names, marking the ones preselected on the Customers page."""
+    managed = set(db.get_managed_customers())
+    names = sorted(managed.union(db.get_customers()), key=str.lower)
+    return jsonify(customers=[{"name": name, "managed": name in managed} for name in names])
+
+
+@api.route("/customers", methods=["POST"])
+def add_customer():
+    """Add a managed customer: {"name": "Acme"}."""
+    data = request.get_json(silent=True)
+    name = data.get("name") if isinstance(data, dict) else None
+    name = name.strip() if isinstance(name, str) else ""
+    if not name:
+        return _error("Customer name cannot be empty.")
+    db.add_customer(name)
+    return jsonify(name=name, managed=True), 201
+
+
+@api.route("/customers/<path:name>", methods=["PATCH"])
+def rename_customer(name):
+    """Rename a customer: {"name": "Acme Corp"}. Add "merge": true to fold it
+    into an existing customer of that name."""
+    data = request.get_json(silent=True)
+    new = data.get("name") if isinstance(data, dict) else None
+    new = new.strip() if isinstance(new, str) else ""
+    if not new:
+        return _error("Customer name cannot be empty.")
+    existing = db.get_customer(new)
+    if existing is not None and new != name and not data.get("merge"):
+        return _error(f'Customer "{new}" already exists; send "merge": true to merge.', 409)
+    if existing is not None:
+        entries = db.merge_customers(name, new)
+    else:
+        entries = db.rename_customer(name, new)
+    if entries is None:
+        return _error("Customer not found.", 404)
+    return jsonify(name=new, entries=entries)
+
+
+@api.route("/customers/<path:name>", methods=["DELETE"])
+def remove_customer(name):
+    """Remove a customer from the managed list; its entries are kept."""
+    db.remove_customer(name)
+    return "", 204
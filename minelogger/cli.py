@@ -1,13 +1,36 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import click
 from datetime import date
 from . import db
-from .export import generate_csv
+
+# Commands import what else they need (server, Ollama client, CSV) when they
+# run, so quick commands like "add" start fast.
 
 
 @click.group()
-def cli():
+@click.option("--profile-startup", is_flag=True, default=False,
+              help="Print how long imports, the schema check and the command took.")
+@click.pass_context
+def cli(ctx, profile_startup):
     """mineLogger — local work logger."""
+    imported = time.perf_counter()
     db.init_db()
+    if profile_startup:
+        ready = time.perf_counter()
+
+        def report():
+            done = time.perf_counter()
+            click.echo(
+                f"startup: imports {1000 * (imported - _IMPORT_STARTED):.1f} ms, "
+                f"schema check {1000 * (ready - imported):.1f} ms, "
+                f"command {1000 * (done - ready):.1f} ms "
+                "(python -X importtime shows the import breakdown)",
+                err=True,
+            )
+        ctx.call_on_close(report)
 
 
 @cli.command()
@@ -44,7 +67,9 @@ def add(customer, hours, date_str, description):
 @click.option("--from", "date_from", default=None, help="Start date (YYYY-MM-DD)")
 @click.option("--to", "date_to", default=None, help="End date (YYYY-MM-DD)")
 @click.option("--customer", default=None, help="Filter by customer")
-def list_entries(today, date_str, date_from, date_to, customer):
+@click.option("--format", "output_format", type=click.Choice(["text", "jsonl"]), default="text",
+              show_default=True, help="jsonl prints one JSON object per entry, for piping.")
+def list_entries(today, date_str, date_from, date_to, customer, output_format):
     """List log entries."""
     if today:
         date_str = date.today().isoformat()
@@ -52,59 +77,313 @@ def list_entries(today, date_str, date_from, date_to, customer):
         date_from = date_str
         date_to = date_str
 
-    entries = db.get_entries(date_from=date_from, date_to=date_to, customer=customer)
+    entries = db.iter_entries(date_from=date_from, date_to=date_to, customer=customer)
 
-    if not entries:
-        click.echo("No entries found.")
+    if output_format == "jsonl":
+        import json
+        for e in entries:
+            click.echo(json.dumps(e._asdict(), ensure_ascii=False))
         return
 
-    # Group by date
-    by_date = {}
+    # Entries arrive newest date first, so each date group is printed as
+    # soon as the next date starts.
+    current = None
+    day_total = total_all = 0.0
+    days = 0
     for e in entries:
-        by_date.setdefault(e["date"], []).append(e)
-
-    total_all = 0.0
-    for d in sorted(by_date.keys(), reverse=True):
-        click.echo(d)
-        day_total = 0.0
-        for e in by_date[d]:
-            click.echo(f"  {e['customer']:<20} {e['hours']:>5.1f}h  {e['description']}")
-            day_total += e["hours"]
-        click.echo(f"  {'-' * 40}")
-        click.echo(f"  Total: {day_total:.1f}h")
-        click.echo()
-        total_all += day_total
+        if e.date != current:
+            if current is not None:
+                _echo_day_total(day_total)
+            click.echo(e.date)
+            current = e.date
+            day_total = 0.0
+            days += 1
+        click.echo(f"  {e.customer:<20} {e.hours:>5.1f}h  {e.description}")
+        day_total += e.hours
+        total_all += e.hours
 
-    if len(by_date) > 1:
+    if current is None:
+        click.echo("No entries found.")
+        return
+    _echo_day_total(day_total)
+    if days > 1:
         click.echo(f"Grand total: {total_all:.1f}h")
 
 
+def _echo_day_total(day_total):
+    click.echo(f"  {'-' * 40}")
+    click.echo(f"  Total: {day_total:.1f}h")
+    click.echo()
+
+
 @cli.command()
 @click.option("--from", "date_from", default=None, help="Start date (YYYY-MM-DD)")
 @click.option("--to", "date_to", default=None, help="End date (YYYY-MM-DD)")
 @click.option("--customer", default=None, help="Filter by customer")
 @click.option("--output", default="export.csv", help="Output filename", show_default=True)
-def export(date_from, date_to, customer, output):
+@click.option("--gzip", "use_gzip", is_flag=True, default=False,
+              help="Gzip the output (implied by a .gz filename).")
+def export(date_from, date_to, customer, output, use_gzip):
     """Export entries to CSV."""
-    entries = db.get_entries(date_from=date_from, date_to=date_to, customer=customer)
-    if not entries:
+    count = db.get_entries_total(date_from=date_from, date_to=date_to, customer=customer)["count"]
+    if not count:
         click.echo("No entries to export.")
         return
-    csv_data = generate_csv(entries)
-    with open(output, "w", newline="", encoding="utf-8") as f:
-        f.write(csv_data)
-    click.echo(f"Exported {len(entries)} entries to {output}")
+    if use_gzip and not output.endswith(".gz"):
+        output += ".gz"
+    from .export import iter_csv
+    if output.endswith(".gz"):
+        import gzip
+        f = gzip.open(output, "wt", newline="", encoding="utf-8")
+    else:
+        f = open(output, "w", newline="", encoding="utf-8")
+    entries = db.iter_entries(date_from=date_from, date_to=date_to, customer=customer)
+    with f:
+        for chunk in iter_csv(entries):
+            f.write(chunk)
+    click.echo(f"Exported {count} entries to {output}")
+
+
+@cli.command()
+@click.argument("query", nargs=-1, required=True)
+@click.option("--from", "date_from", default=None, help="Start date (YYYY-MM-DD)")
+@click.option("--to", "date_to", default=None, help="End date (YYYY-MM-DD)")
+@click.option("--customer", default=None, help="Filter by customer")
+@click.option("--limit", default=20, show_default=True, help="Maximum results to show")
+def search(query, date_from, date_to, customer, limit):
+    """Search entry descriptions and customers, best matches first."""
+    query = " ".join(query)
+    entries = db.search_entries(query, date_from=date_from, date_to=date_to,
+                                customer=customer, limit=limit)
+    if not entries:
+        click.echo("No matching entries.")
+        return
+    for e in entries:
+        text = e["highlighted"]
+        for marker, styled in ((db.HIGHLIGHT_START, "\x1b[1m"), (db.HIGHLIGHT_END, "\x1b[22m")):
+            text = text.replace(marker, styled)
+        click.echo(f"{e['date']}  {e['customer']:<20} {e['hours']:>5.1f}h  {text}")
+    total = db.search_total(query, date_from=date_from, date_to=date_to, customer=customer)
+    if total["count"] > len(entries):
+        click.echo(f"Showing {len(entries)} of {total['count']} matches ({total['hours']:.1f}h).")
+    else:
+        click.echo(f"{total['count']} matches, {total['hours']:.1f}h.")
+
+
+@cli.command()
+@click.argument("source", type=click.File("r", encoding="utf-8"), default="-")
+@click.option("--concurrency", default=3, show_default=True,
+              help="Maximum simultaneous requests to Ollama.")
+@click.option("--no-cache", "no_cache", is_flag=True, default=False,
+              help="Ignore cached extractions.")
+@click.option("--yes", "-y", "assume_yes", is_flag=True, default=False,
+              help="Save every extracted entry without asking.")
+def batch(source, concurrency, no_cache, assume_yes):
+    """Extract several entries from free text (a file, or stdin with '-').
+
+    One entry per line or per ';'-separated item, e.g. "Mon: 3h Acme migration".
+    """
+    from .ollama import extract_batch, split_entries
+
+    items = split_entries(source.read())
+    if not items:
+        click.echo("No entries found.")
+        return
+    customers = db.get_managed_customers()
+    results = extract_batch(items, customers, use_cache=not no_cache, max_concurrent=concurrency)
+
+    confirmed = []
+    for result in results:
+        click.echo(result["input"])
+        entry = result["entry"]
+        if entry is None:
+            click.echo(f"  ! {result['error']}")
+            continue
+        click.echo(f"  {entry['date']} | {entry['customer']} | {entry['hours']}h | "
+                   f"{entry['description']}  ({entry['source']})")
+        if assume_yes or click.confirm("  Save?", default=True):
+            confirmed.append(entry)
+
+    if confirmed:
+        saved = len(db.add_entries(confirmed))
+        click.echo(f"Saved {saved} entr{'y' if saved == 1 else 'ies'}.")
+    else:
+        click.echo("Nothing saved.")
+
+
+@cli.group(name="db")
+def database():
+    """Database maintenance."""
+
+
+@database.command()
+def status():
+    """Show the database path and schema version."""
+    click.echo(f"Database: {db.DB_PATH}")
+    click.echo(f"Schema version: {db.get_schema_version()} (latest {db.SCHEMA_VERSION})")
+
+
+@database.command()
+def explain():
+    """Show EXPLAIN QUERY PLAN output for the hot queries."""
+    for name, plan in db.explain_hot_queries().items():
+        click.echo(name)
+        for detail in plan:
+            flag = ""
+            if detail.startswith("SCAN"):
+                flag = "   <-- full scan"
+            elif "TEMP B-TREE" in detail:
+                flag = "   <-- sorts in memory"
+            click.echo(f"  {detail}{flag}")
+        click.echo()
+
+
+@database.command(name="rebuild-rollups")
+def rebuild_rollups():
+    """Regenerate the monthly summary table from the entries."""
+    count = db.rebuild_rollups()
+    click.echo(f"Rebuilt monthly totals: {count} month/customer rows.")
+
+
+@cli.group()
+def cache():
+    """Chat extraction cache."""
+
+
+@cache.command(name="stats")
+def cache_stats():
+    """Show extraction cache size and hit rate."""
+    stats = db.cache_stats()
+    lookups = stats["hits"] + stats["misses"]
+    rate = f"{100 * stats['hits'] / lookups:.0f}%" if lookups else "n/a"
+    click.echo(f"Entries: {stats['entries']}")
+    click.echo(f"Hits:    {stats['hits']}")
+    click.echo(f"Misses:  {stats['misses']}")
+    click.echo(f"Hit rate: {rate}")
+
+
+@cache.command(name="clear")
+def cache_clear():
+    """Remove all cached extractions."""
+    removed = db.cache_clear()
+    click.echo(f"Removed {removed} cached extraction{'' if removed == 1 else 's'}.")
+
+
+@cli.group()
+def customers():
+    """Rename and merge customers."""
+
+
+@customers.command(name="rename")
+@click.argument("old")
+@click.argument("new")
+def customers_rename(old, new):
+    """Rename customer OLD to NEW on all its entries."""
+    if db.get_customer(new) is not None:
+        raise click.ClickException(f'"{new}" already exists; use "customers merge" instead.')
+    count = db.rename_customer(old, new)
+    if count is None:
+        raise click.ClickException(f'No customer named "{old}".')
+    click.echo(f'Renamed "{old}" to "{new}" ({count} entr{"y" if count == 1 else "ies"}).')
+
+
+@customers.command(name="merge")
+@click.argument("source")
+@click.argument("target")
+def customers_merge(source, target):
+    """Move all of SOURCE's entries to TARGET and remove SOURCE."""
+    count = db.merge_customers(source, target)
+    if count is None:
+        raise click.ClickException(f'No customer named "{source}".')
+    click.echo(f'Merged "{source}" into "{target}" ({count} entr{"y" if count == 1 else "ies"} moved).')
+
+
+@cli.group()
+def sync():
+    """Sync entries with another installation using delta files."""
+
+
+@sync.command(name="export")
+@click.argument("output", type=click.Path(dir_okay=False))
+@click.option("--since", type=int, default=None,
+              help="Only changes after this sequence number [default: where the last export ended]")
+def sync_export(output, since):
+    """Write changed and deleted entries to a delta file (.gz to compress)."""
+    from .sync import export_delta
+    if since is None:
+        since = db.get_counter("sync_exported_seq")
+    count, until = export_delta(output, since)
+    db.set_counter("sync_exported_seq", until)
+    click.echo(f"Wrote {count} change{'' if count == 1 else 's'} ({since} to {until}) to {output}")
+
+
+@sync.command(name="apply")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def sync_apply(path):
+    """Apply a delta file written by 'sync export' on another installation."""
+    from .sync import DeltaError, apply_delta
+    try:
+        header, counts = apply_delta(path)
+    except DeltaError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Changes {header['since']} to {header['until']}: {counts['inserted']} added, "
+               f"{counts['matched']} matched existing entries, {counts['updated']} updated, "
+               f"{counts['deleted']} deleted, {counts['renamed']} customers renamed, "
+               f"{counts['skipped']} already up to date.")
+    if counts["invalid"]:
+        click.echo(f"Ignored {counts['invalid']} invalid entr"
+                   f"{'y' if counts['invalid'] == 1 else 'ies'}.", err=True)
+
+
+@sync.command(name="status")
+def sync_status():
+    """Show the change feed position and where the last export ended."""
+    stats = db.get_change_stats()
+    click.echo(f"Latest change:  {stats['seq']}")
+    click.echo(f"Last export:    {db.get_counter('sync_exported_seq')}")
+    click.echo(f"Entries:        {stats['entries']}")
+    click.echo(f"Tombstones:     {stats['tombstones']}")
 
 
 @cli.command()
 @click.option("--port", default=5001, show_default=True, help="Port to listen on")
 @click.option("--no-browser", "no_browser", is_flag=True, default=False,
               help="Start server without opening the browser (used for autostart).")
-def ui(port, no_browser):
+@click.option("--keep-alive", default="30m", show_default=True,
+              help="How long Ollama keeps the model loaded between requests (e.g. 30m, 2h, -1).")
+@click.option("--no-warm-up", "no_warm_up", is_flag=True, default=False,
+              help="Do not preload the Ollama model at startup.")
+@click.option("--connect-timeout", default=3.05, show_default=True, type=float,
+              help="Seconds to wait for a connection to Ollama.")
+@click.option("--read-timeout", default=30.0, show_default=True, type=float,
+              help="Seconds to wait for Ollama to respond once connected.")
+@click.option("--threads", default=8, show_default=True,
+              help="Worker threads handling requests.")
+@click.option("--idle-timeout", default=120, show_default=True, type=click.IntRange(min=1),
+              help="Close browser connections with no traffic for this many seconds. "
+                   "Does not limit how long a request may take.")
+@click.option("--shutdown-timeout", default=10, show_default=True,
+              help="Seconds to let in-flight requests finish when stopping.")
+@click.option("--dev", is_flag=True, default=False,
+              help="Use the Werkzeug development server instead of the production server.")
+@click.option("--metrics", "enable_metrics", is_flag=True, default=False,
+              help="Record request, query and Ollama timings and serve them on /metrics.")
+@click.option("--slow-ms", default=500, show_default=True,
+              help="With --metrics, log requests, queries and Ollama calls slower than this.")
+@click.option("--writer/--no-writer", "use_writer", default=True, show_default=True,
+              help="Apply database writes on one background thread, in batches.")
+def ui(port, no_browser, keep_alive, no_warm_up, connect_timeout, read_timeout,
+       threads, idle_timeout, shutdown_timeout, dev, enable_metrics, slow_ms, use_writer):
     """Start the web UI."""
-    import logging, webbrowser, threading
+    import logging, logging.handlers, queue, webbrowser, threading
     from pathlib import Path
-    from .server import create_app
+    from . import metrics, ollama
+    from .server import create_app, serve
+
+    ollama.configure(keep_alive=keep_alive, connect_timeout=connect_timeout,
+                     read_timeout=read_timeout)
+    if not no_warm_up:
+        ollama.warm_up_in_background()
 
     # File logging — always write to ~/.minelogger/minelogger-server.log
     log_path = Path.home() / ".minelogger" / "minelogger-server.log"
@@ -113,8 +392,17 @@ def ui(port, no_browser):
     handler.setFormatter(logging.Formatter(
         "%(asctime)s %(levelname)s %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
     ))
-    logging.getLogger("werkzeug").addHandler(handler)
-    logging.getLogger("werkzeug").setLevel(logging.INFO)
+    # Request threads only enqueue records; a background thread writes the file
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    for name in ("werkzeug", "waitress", "minelogger.access", "minelogger.slow"):
+        logging.getLogger(name).addHandler(queue_handler)
+        logging.getLogger(name).setLevel(logging.INFO)
+    listener.start()
+
+    if enable_metrics:
+        metrics.enable(slow_ms=slow_ms)
 
     app = create_app()
     url = f"http://localhost:{port}"
@@ -125,4 +413,14 @@ def ui(port, no_browser):
             webbrowser.open_new_tab(url)
         threading.Thread(target=open_browser, daemon=True).start()
     click.echo(f"Starting web UI at {url} — press Ctrl+C to stop")
-    app.run(port=port, debug=False)
+    if use_writer:
+        db.start_writer()
+    try:
+        if dev:
+            app.run(port=port, debug=False)
+        else:
+            serve(app, port=port, threads=threads, idle_timeout=idle_timeout,
+                  shutdown_timeout=shutdown_timeout)
+    finally:
+        db.stop_writer()
+        listener.stop()
@@ -1,19 +1,562 @@
+import hashlib
+import itertools
+import re
 import sqlite3
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
 from pathlib import Path
-from datetime import datetime, date
+from datetime import datetime, date, timezone
+
+from .metrics import timed_query
+from .validation import validate_entry
 
 DB_DIR = Path.home() / ".minelogger"
 DB_PATH = DB_DIR / "minelogger.db"
 
+# Applied once per connection. WAL lets the web UI keep reading while the chat
+# and add forms write; cache_size is in KiB when negative (~32 MB).
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -32000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
 
-def _connect():
-    DB_DIR.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+_local = threading.local()
+
+# Marks around matched words in search results (see search_entries)
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+_SEARCH_WORD_RE = re.compile(r"\w+")
+
+# Compact row type yielded by iter_entries; get_entries still returns dicts
+Entry = namedtuple("Entry", "id date customer hours description created_at")
+
+
+def entry_hash(date_str, customer_id, hours, description):
+    """Content hash used to recognise the same entry across imports.
+
+    It covers the customer's id rather than its name, so renaming a
+    customer leaves its entries untouched.
+    """
+    key = "\x1f".join((date_str, str(customer_id), repr(float(hours)), description))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def utc_now():
+    """Timestamp for ``updated_at``: UTC with milliseconds, sortable as text."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _open(path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
+    conn.create_function("entry_hash", 4, entry_hash, deterministic=True)
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _connect():
+    """Return this thread's connection, opening and tuning it on first use.
+
+    The connection stays open for the life of the thread, so callers keep
+    using ``with _connect() as conn:`` for commit/rollback but must not close it.
+    """
+    batch_conn = getattr(_local, "batch_conn", None)
+    if batch_conn is not None:
+        return batch_conn  # inside a writer batch (see writer.py)
+    conn = getattr(_local, "conn", None)
+    path = str(DB_PATH)
+    if conn is None or _local.path != path:
+        if conn is not None:
+            conn.close()
+        conn = _open(path)
+        _local.conn = conn
+        _local.path = path
     return conn
 
 
+def close_connection():
+    """Close this thread's connection, if one is open."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+_writer = None
+
+
+def start_writer(**options):
+    """Send all writes to a single background writer thread from now on.
+
+    See writer.py. Options are passed to ``writer.Writer``. Returns the writer.
+    """
+    global _writer
+    if _writer is None:
+        from .writer import Writer
+        _writer = Writer(**options)
+        _writer.start()
+    return _writer
+
+
+def stop_writer():
+    """Finish queued writes and go back to writing on the caller's thread."""
+    global _writer
+    writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
+
+
+def _write(fn):
+    """Run a write function on the writer thread when one is started."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        writer = _writer
+        if writer is None or writer.in_writer_thread():
+            return fn(*args, **kwargs)
+        return writer.submit(fn, args, kwargs)
+    return wrapper
+
+
+# Small read-mostly lists (customers, months) kept in memory per database
+# file and data version; {function name: (path, version, result)}
+_lookups = {}
+_lookup_stats = {}
+_lookup_lock = threading.Lock()
+
+
+def _cached_lookup(fn):
+    """Reuse ``fn()``'s result until the database's data version changes.
+
+    The version is read before the query, so a write that lands in between
+    leaves an entry tagged with the older version, which the next call
+    replaces. Writes from other processes bump the same stored counter.
+    """
+    name = fn.__name__
+
+    @wraps(fn)
+    def wrapper():
+        key = (str(DB_PATH), get_data_version())
+        cached = _lookups.get(name)
+        hit = cached is not None and cached[:2] == key
+        with _lookup_lock:
+            stats = _lookup_stats.setdefault(name, {"hits": 0, "misses": 0})
+            stats["hits" if hit else "misses"] += 1
+        if hit:
+            return list(cached[2])
+        result = fn()
+        _lookups[name] = key + (result,)
+        return list(result)
+    return wrapper
+
+
+def lookup_cache_stats():
+    """Return {function name: {"hits": ..., "misses": ...}} for the lookup cache."""
+    with _lookup_lock:
+        return {name: dict(stats) for name, stats in _lookup_stats.items()}
+
+
+def clear_lookup_cache():
+    _lookups.clear()
+
+
+def _search_index_migration(conn):
+    """Full-text index over descriptions and customers, kept current by triggers.
+
+    Python builds whose SQLite lacks FTS5 skip it; search then falls back to
+    a plain scan.
+    """
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+    except sqlite3.OperationalError:
+        return ""
+    return """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5 (
+        description, customer,
+        content = 'entries', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS entries_fts_insert AFTER INSERT ON entries
+    BEGIN
+        INSERT INTO entries_fts (rowid, description, customer)
+        VALUES (NEW.id, NEW.description, NEW.customer);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries
+    BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, description, customer)
+        VALUES ('delete', OLD.id, OLD.description, OLD.customer);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS entries_fts_update
+    AFTER UPDATE OF description, customer ON entries
+    BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, description, customer)
+        VALUES ('delete', OLD.id, OLD.description, OLD.customer);
+        INSERT INTO entries_fts (rowid, description, customer)
+        VALUES (NEW.id, NEW.description, NEW.customer);
+    END;
+
+    INSERT INTO entries_fts (entries_fts) VALUES ('rebuild');
+    """
+
+
+def _customer_keys_migration(conn):
+    """Store each customer name once and point entries at it by id.
+
+    Entries are copied into a rebuilt table with ``customer_id`` in place of
+    the name, so their triggers and indexes are recreated here. Reads go
+    through the ``entry_rows`` view, which joins the name back in; the
+    search index reads from the view too and is refreshed when a customer
+    is renamed.
+    """
+    has_fts = _search_index_migration(conn) != ""
+    script = """
+    ALTER TABLE customers ADD COLUMN managed INTEGER NOT NULL DEFAULT 0;
+    UPDATE customers SET managed = 1;
+    INSERT INTO customers (name, created_at, managed)
+    SELECT customer, MIN(created_at), 0 FROM entries
+    WHERE customer NOT IN (SELECT name FROM customers)
+    GROUP BY customer;
+
+    DROP TABLE IF EXISTS entries_fts;
+    CREATE TABLE entries_new (
+        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+        date         TEXT    NOT NULL,
+        customer_id  INTEGER NOT NULL REFERENCES customers (id),
+        hours        REAL    NOT NULL,
+        description  TEXT    NOT NULL,
+        created_at   TEXT    NOT NULL,
+        content_hash TEXT,
+        uid          TEXT,
+        updated_at   TEXT
+    );
+    INSERT INTO entries_new (id, date, customer_id, hours, description, created_at,
+                             content_hash, uid, updated_at)
+    SELECT e.id, e.date, c.id, e.hours, e.description, e.created_at,
+           e.content_hash, e.uid, e.updated_at
+    FROM entries AS e JOIN customers AS c ON c.name = e.customer
+    ORDER BY e.id;
+    -- keep the id high-water mark so deleted ids are not handed out again
+    UPDATE sqlite_sequence
+    SET seq = (SELECT MAX(seq) FROM sqlite_sequence WHERE name IN ('entries', 'entries_new'))
+    WHERE name = 'entries_new';
+    DROP TABLE entries;
+    ALTER TABLE entries_new RENAME TO entries;
+
+    CREATE INDEX idx_entries_date ON entries (date);
+    CREATE INDEX idx_entries_customer_date ON entries (customer_id, date);
+    CREATE INDEX idx_entries_content_hash ON entries (content_hash);
+    CREATE UNIQUE INDEX idx_entries_uid ON entries (uid);
+
+    CREATE VIEW entry_rows AS
+    SELECT e.id, e.date, c.name AS customer, e.hours, e.description, e.created_at,
+           e.content_hash, e.uid, e.updated_at, e.customer_id
+    FROM entries AS e JOIN customers AS c ON c.id = e.customer_id;
+
+    DROP TABLE monthly_totals;
+    CREATE TABLE monthly_totals (
+        month       TEXT    NOT NULL,
+        customer_id INTEGER NOT NULL,
+        hours       REAL    NOT NULL,
+        entries     INTEGER NOT NULL,
+        PRIMARY KEY (month, customer_id)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER entries_rollup_insert AFTER INSERT ON entries
+    BEGIN
+        INSERT INTO monthly_totals (month, customer_id, hours, entries)
+        VALUES (substr(NEW.date, 1, 7), NEW.customer_id, NEW.hours, 1)
+        ON CONFLICT (month, customer_id) DO UPDATE
+            SET hours = hours + excluded.hours, entries = entries + 1;
+    END;
+
+    CREATE TRIGGER entries_rollup_delete AFTER DELETE ON entries
+    BEGIN
+        UPDATE monthly_totals SET hours = hours - OLD.hours, entries = entries - 1
+        WHERE month = substr(OLD.date, 1, 7) AND customer_id = OLD.customer_id;
+        DELETE FROM monthly_totals
+        WHERE month = substr(OLD.date, 1, 7) AND customer_id = OLD.customer_id AND entries <= 0;
+    END;
+
+    CREATE TRIGGER entries_rollup_update
+    AFTER UPDATE OF date, customer_id, hours ON entries
+    BEGIN
+        UPDATE monthly_totals SET hours = hours - OLD.hours, entries = entries - 1
+        WHERE month = substr(OLD.date, 1, 7) AND customer_id = OLD.customer_id;
+        DELETE FROM monthly_totals
+        WHERE month = substr(OLD.date, 1, 7) AND customer_id = OLD.customer_id AND entries <= 0;
+        INSERT INTO monthly_totals (month, customer_id, hours, entries)
+        VALUES (substr(NEW.date, 1, 7), NEW.customer_id, NEW.hours, 1)
+        ON CONFLICT (month, customer_id) DO UPDATE
+            SET hours = hours + excluded.hours, entries = entries + 1;
+    END;
+
+    INSERT INTO monthly_totals (month, customer_id, hours, entries)
+    SELECT substr(date, 1, 7), customer_id, SUM(hours), COUNT(*)
+    FROM entries GROUP BY 1, 2;
+
+    CREATE TRIGGER entries_changes_insert AFTER INSERT ON entries
+    BEGIN
+        DELETE FROM changes WHERE uid = NEW.uid;
+        INSERT INTO changes (uid, op, updated_at) VALUES (NEW.uid, 'upsert', NEW.updated_at);
+    END;
+
+    CREATE TRIGGER entries_changes_update
+    AFTER UPDATE OF date, customer_id, hours, description, updated_at ON entries
+    BEGIN
+        DELETE FROM changes WHERE uid = NEW.uid;
+        INSERT INTO changes (uid, op, updated_at) VALUES (NEW.uid, 'upsert', NEW.updated_at);
+    END;
+
+    CREATE TRIGGER entries_changes_delete AFTER DELETE ON entries
+    BEGIN
+        DELETE FROM changes WHERE uid = OLD.uid;
+        INSERT INTO changes (uid, op, updated_at)
+        VALUES (OLD.uid, 'delete', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+    END;
+    """
+    if not has_fts:
+        return script
+    return script + """
+    CREATE VIRTUAL TABLE entries_fts USING fts5 (
+        description, customer,
+        content = 'entry_rows', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    );
+
+    CREATE TRIGGER entries_fts_insert AFTER INSERT ON entries
+    BEGIN
+        INSERT INTO entries_fts (rowid, description, customer)
+        SELECT NEW.id, NEW.description, name FROM customers WHERE id = NEW.customer_id;
+    END;
+
+    CREATE TRIGGER entries_fts_delete AFTER DELETE ON entries
+    BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, description, customer)
+        SELECT 'delete', OLD.id, OLD.description, name FROM customers WHERE id = OLD.customer_id;
+    END;
+
+    CREATE TRIGGER entries_fts_update
+    AFTER UPDATE OF description, customer_id ON entries
+    BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, description, customer)
+        SELECT 'delete', OLD.id, OLD.description, name FROM customers WHERE id = OLD.customer_id;
+        INSERT INTO entries_fts (rowid, description, customer)
+        SELECT NEW.id, NEW.description, name FROM customers WHERE id = NEW.customer_id;
+    END;
+
+    CREATE TRIGGER customers_fts_rename AFTER UPDATE OF name ON customers
+    BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, description, customer)
+        SELECT 'delete', id, description, OLD.name FROM entries WHERE customer_id = OLD.id;
+        INSERT INTO entries_fts (rowid, description, customer)
+        SELECT id, description, NEW.name FROM entries WHERE customer_id = NEW.id;
+    END;
+
+    INSERT INTO entries_fts (entries_fts) VALUES ('rebuild');
+    """
+
+
+# Schema migrations, applied in order. The database's PRAGMA user_version
+# records how many have run, so existing files are upgraded in place. A
+# migration may also be a function of the connection returning the script.
+_MIGRATIONS = [
+    # 1: indexes for the date-range, customer and duplicate-check queries
+    """
+    CREATE INDEX IF NOT EXISTS idx_entries_date ON entries (date);
+    CREATE INDEX IF NOT EXISTS idx_entries_customer_date ON entries (customer, date);
+    CREATE INDEX IF NOT EXISTS idx_entries_dedup
+        ON entries (date, customer, hours, description);
+    """,
+    # 2: per-month, per-customer rollup kept current by triggers
+    """
+    CREATE TABLE IF NOT EXISTS monthly_totals (
+        month    TEXT    NOT NULL,
+        customer TEXT    NOT NULL,
+        hours    REAL    NOT NULL,
+        entries  INTEGER NOT NULL,
+        PRIMARY KEY (month, customer)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS entries_rollup_insert AFTER INSERT ON entries
+    BEGIN
+        INSERT INTO monthly_totals (month, customer, hours, entries)
+        VALUES (substr(NEW.date, 1, 7), NEW.customer, NEW.hours, 1)
+        ON CONFLICT (month, customer) DO UPDATE
+            SET hours = hours + excluded.hours, entries = entries + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS entries_rollup_delete AFTER DELETE ON entries
+    BEGIN
+        UPDATE monthly_totals SET hours = hours - OLD.hours, entries = entries - 1
+        WHERE month = substr(OLD.date, 1, 7) AND customer = OLD.customer;
+        DELETE FROM monthly_totals
+        WHERE month = substr(OLD.date, 1, 7) AND customer = OLD.customer AND entries <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS entries_rollup_update
+    AFTER UPDATE OF date, customer, hours ON entries
+    BEGIN
+        UPDATE monthly_totals SET hours = hours - OLD.hours, entries = entries - 1
+        WHERE month = substr(OLD.date, 1, 7) AND customer = OLD.customer;
+        DELETE FROM monthly_totals
+        WHERE month = substr(OLD.date, 1, 7) AND customer = OLD.customer AND entries <= 0;
+        INSERT INTO monthly_totals (month, customer, hours, entries)
+        VALUES (substr(NEW.date, 1, 7), NEW.customer, NEW.hours, 1)
+        ON CONFLICT (month, customer) DO UPDATE
+            SET hours = hours + excluded.hours, entries = entries + 1;
+    END;
+
+    DELETE FROM monthly_totals;
+    INSERT INTO monthly_totals (month, customer, hours, entries)
+    SELECT substr(date, 1, 7), customer, SUM(hours), COUNT(*)
+    FROM entries GROUP BY 1, 2;
+    """,
+    # 3: content hash for set-based duplicate detection on import
+    """
+    ALTER TABLE entries ADD COLUMN content_hash TEXT;
+    UPDATE entries SET content_hash = entry_hash(date, customer, hours, description);
+    CREATE INDEX IF NOT EXISTS idx_entries_content_hash ON entries (content_hash);
+    DROP INDEX IF EXISTS idx_entries_dedup;
+    """,
+    # 4: chat extraction cache and named counters
+    """
+    CREATE TABLE IF NOT EXISTS extraction_cache (
+        key        TEXT PRIMARY KEY,
+        result     TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        last_used  REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_used
+        ON extraction_cache (last_used);
+    CREATE TABLE IF NOT EXISTS counters (
+        name  TEXT    PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """,
+    # 5: full-text search
+    _search_index_migration,
+    # 6: change feed for sync between installations. Each entry gets a
+    # stable uid and an updated_at (UTC); ``changes`` keeps the latest change
+    # per uid, so rewriting it takes a new seq and deletes leave a tombstone.
+    """
+    ALTER TABLE entries ADD COLUMN uid TEXT;
+    ALTER TABLE entries ADD COLUMN updated_at TEXT;
+    UPDATE entries SET
+        uid = lower(hex(randomblob(16))),
+        updated_at = COALESCE(strftime('%Y-%m-%dT%H:%M:%fZ', created_at, 'utc'),
+                              strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_uid ON entries (uid);
+
+    CREATE TABLE IF NOT EXISTS changes (
+        seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+        uid        TEXT    NOT NULL UNIQUE,
+        op         TEXT    NOT NULL,
+        updated_at TEXT    NOT NULL
+    );
+
+    CREATE TRIGGER IF NOT EXISTS entries_changes_insert AFTER INSERT ON entries
+    BEGIN
+        DELETE FROM changes WHERE uid = NEW.uid;
+        INSERT INTO changes (uid, op, updated_at) VALUES (NEW.uid, 'upsert', NEW.updated_at);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS entries_changes_update
+    AFTER UPDATE OF date, customer, hours, description, updated_at ON entries
+    BEGIN
+        DELETE FROM changes WHERE uid = NEW.uid;
+        INSERT INTO changes (uid, op, updated_at) VALUES (NEW.uid, 'upsert', NEW.updated_at);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS entries_changes_delete AFTER DELETE ON entries
+    BEGIN
+        DELETE FROM changes WHERE uid = OLD.uid;
+        INSERT INTO changes (uid, op, updated_at)
+        VALUES (OLD.uid, 'delete', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+    END;
+
+    INSERT INTO changes (uid, op, updated_at)
+    SELECT uid, 'upsert', updated_at FROM entries ORDER BY id;
+    """,
+    # 7: customers stored once, entries keyed by customer_id
+    _customer_keys_migration,
+    # 8: remember which changes arrived by sync, so exports do not echo them back
+    """
+    ALTER TABLE changes ADD COLUMN origin TEXT NOT NULL DEFAULT 'local';
+    """,
+    # 9: content hashes cover customer_id, so a rename does not touch entries
+    """
+    UPDATE entries SET content_hash = entry_hash(date, customer_id, hours, description);
+    """,
+    # 10: customer renames in the change feed: uid "customer:<old name>", name = new name
+    """
+    ALTER TABLE changes ADD COLUMN name TEXT;
+    """,
+]
+
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+# Migrations that copy every entry into a new table. The old pages stay in
+# the file as free space, so it is vacuumed afterwards.
+_REBUILDS = {7}
+
+# Representative queries used by the UI and CLI, checked by explain_hot_queries().
+_HOT_QUERIES = {
+    "entries by date range": (
+        "SELECT * FROM entry_rows WHERE date >= ? AND date <= ? ORDER BY date DESC, id DESC",
+        ("2026-01-01", "2026-01-31"),
+    ),
+    "entries by customer": (
+        "SELECT * FROM entry_rows WHERE customer_id = (SELECT id FROM customers WHERE name = ?)"
+        " ORDER BY date DESC, id DESC",
+        ("Acme",),
+    ),
+    "entries by customer and date range": (
+        "SELECT * FROM entry_rows WHERE date >= ? AND date <= ?"
+        " AND customer_id = (SELECT id FROM customers WHERE name = ?)"
+        " ORDER BY date DESC, id DESC",
+        ("2026-01-01", "2026-01-31", "Acme"),
+    ),
+    "customers with entries": (
+        "SELECT name FROM customers AS c"
+        " WHERE EXISTS (SELECT 1 FROM entries WHERE customer_id = c.id) ORDER BY name ASC",
+        (),
+    ),
+    "months with entries": (
+        "SELECT DISTINCT month FROM monthly_totals ORDER BY month DESC",
+        (),
+    ),
+    "monthly summary": (
+        "SELECT c.name AS customer, m.hours"
+        " FROM monthly_totals AS m JOIN customers AS c ON c.id = m.customer_id"
+        " WHERE m.month = ? ORDER BY c.name ASC",
+        ("2026-01",),
+    ),
+    "duplicate check": (
+        "SELECT 1 FROM entries WHERE content_hash = ?",
+        (entry_hash("2026-01-01", 1, 1.0, "Standup"),),
+    ),
+}
+
+
 def init_db():
+    """Create or upgrade the schema.
+
+    An up-to-date database costs a single PRAGMA read, so this is cheap to
+    call at the start of every command.
+    """
+    if get_schema_version() == SCHEMA_VERSION:
+        return
     with _connect() as conn:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS entries (
@@ -32,66 +575,366 @@ def init_db():
                 created_at TEXT    NOT NULL
             )
         """)
+    migrate()
+
+
+def get_schema_version():
+    return _connect().execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate():
+    """Apply pending migrations. Returns the list of versions applied."""
+    conn = _connect()
+    applied = []
+    current = get_schema_version()
+    for version, script in enumerate(_MIGRATIONS[current:], start=current + 1):
+        if callable(script):
+            script = script(conn)
+        # executescript() commits first and runs outside the implicit
+        # transaction, so wrap each migration in its own explicit one.
+        try:
+            conn.executescript(
+                f"BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;"
+            )
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        applied.append(version)
+    if _REBUILDS.intersection(applied):
+        conn.execute("VACUUM")
+    return applied
+
 
+def explain_hot_queries():
+    """Return {name: [plan detail, ...]} from EXPLAIN QUERY PLAN for the hot queries."""
+    conn = _connect()
+    plans = {}
+    for name, (query, params) in _HOT_QUERIES.items():
+        rows = conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+        plans[name] = [row["detail"] for row in rows]
+    return plans
 
+
+def _customer_id(conn, name):
+    """Return the id of customer ``name``, adding it (not managed) if it is new."""
+    row = conn.execute("SELECT id FROM customers WHERE name = ?", (name,)).fetchone()
+    if row is not None:
+        return row["id"]
+    return conn.execute(
+        "INSERT INTO customers (name, created_at) VALUES (?, ?)",
+        (name, datetime.now().isoformat(timespec="seconds")),
+    ).lastrowid
+
+
+# New entries get a random uid, which identifies them across installations
+_INSERT_ENTRY = """
+    INSERT INTO entries (date, customer_id, hours, description, created_at, content_hash,
+                         updated_at, uid)
+    VALUES (?, ?, ?, ?, ?, ?, ?, lower(hex(randomblob(16))))
+"""
+
+
+@timed_query
+@_write
 def add_entry(date_str, customer, hours, description):
     created_at = datetime.now().isoformat(timespec="seconds")
     with _connect() as conn:
+        customer_id = _customer_id(conn, customer)
         conn.execute(
-            "INSERT INTO entries (date, customer, hours, description, created_at) VALUES (?, ?, ?, ?, ?)",
-            (date_str, customer, float(hours), description, created_at),
+            _INSERT_ENTRY,
+            (date_str, customer_id, float(hours), description, created_at,
+             entry_hash(date_str, customer_id, hours, description), utc_now()),
         )
+        _touch(conn)
+
+
+@timed_query
+@_write
+def add_entries(rows):
+    """Insert several entries in one transaction. Returns their new ids, in order."""
+    created_at = datetime.now().isoformat(timespec="seconds")
+    updated_at = utc_now()
+    ids = []
+    with _connect() as conn:
+        customer_ids = {name: _customer_id(conn, name) for name in {r["customer"] for r in rows}}
+        for r in rows:
+            customer_id = customer_ids[r["customer"]]
+            cursor = conn.execute(
+                _INSERT_ENTRY,
+                (r["date"], customer_id, float(r["hours"]), r["description"], created_at,
+                 entry_hash(r["date"], customer_id, r["hours"], r["description"]), updated_at),
+            )
+            ids.append(cursor.lastrowid)
+        if ids:
+            _touch(conn)
+    return ids
+
 
+def _filter_clause(date_from=None, date_to=None, customer=None, table=""):
+    """Build the WHERE clause shared by the entry queries. Returns (sql, params).
 
-def get_entries(date_from=None, date_to=None, customer=None):
-    query = "SELECT * FROM entries WHERE 1=1"
+    ``table`` qualifies the column names when the query joins other tables.
+    """
+    prefix = table + "." if table else ""
+    clause = " WHERE 1=1"
     params = []
     if date_from:
-        query += " AND date >= ?"
+        clause += f" AND {prefix}date >= ?"
         params.append(date_from)
     if date_to:
-        query += " AND date <= ?"
+        clause += f" AND {prefix}date <= ?"
         params.append(date_to)
     if customer:
-        query += " AND customer = ?"
+        clause += f" AND {prefix}customer_id = (SELECT id FROM customers WHERE name = ?)"
         params.append(customer)
-    query += " ORDER BY date DESC, id DESC"
+    return clause, params
+
+
+@timed_query
+def get_entries(date_from=None, date_to=None, customer=None, limit=None, after=None, before=None):
+    """Return matching entries, newest first.
+
+    ``after`` and ``before`` are ``(date, id)`` keyset cursors: ``after`` returns
+    the entries that follow the cursor in display order (older), ``before`` the
+    ones that precede it (newer). Combine with ``limit`` to page through the log.
+    """
+    clause, params = _filter_clause(date_from, date_to, customer)
+    query = "SELECT * FROM entry_rows" + clause
+    if after:
+        query += " AND (date, id) < (?, ?)"
+        params.extend(after)
+    if before:
+        query += " AND (date, id) > (?, ?)"
+        params.extend(before)
+    # Walk backwards from a "before" cursor so LIMIT keeps the rows nearest to it.
+    query += " ORDER BY date ASC, id ASC" if before else " ORDER BY date DESC, id DESC"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
     with _connect() as conn:
-        return [dict(row) for row in conn.execute(query, params).fetchall()]
+        rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+    if before:
+        rows.reverse()
+    return rows
+
+
+def iter_entries(date_from=None, date_to=None, customer=None, arraysize=500):
+    """Yield matching entries newest first as ``Entry`` tuples.
+
+    Rows are fetched from the cursor ``arraysize`` at a time, so memory use
+    does not grow with the size of the range.
+    """
+    clause, params = _filter_clause(date_from, date_to, customer)
+    cursor = _connect().cursor()
+    cursor.row_factory = None  # plain tuples, in Entry's field order
+    cursor.arraysize = arraysize
+    cursor.execute(
+        f"SELECT {', '.join(Entry._fields)} FROM entry_rows" + clause
+        + " ORDER BY date DESC, id DESC",
+        params,
+    )
+    try:
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            yield from map(Entry._make, rows)
+    finally:
+        cursor.close()
+
+
+@timed_query
+def get_entries_total(date_from=None, date_to=None, customer=None):
+    """Return {"count": ..., "hours": ...} for the matching entries."""
+    clause, params = _filter_clause(date_from, date_to, customer)
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT COUNT(*) AS count, COALESCE(SUM(hours), 0) AS hours FROM entries" + clause,
+            params,
+        ).fetchone()
+    return {"count": row["count"], "hours": row["hours"]}
+
+
+def _has_search_index(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'entries_fts'"
+    ).fetchone() is not None
+
+
+def _search_clause(conn, query, date_from=None, date_to=None, customer=None):
+    """Return (from_and_where_sql, params) for a search, or None if nothing to search."""
+    words = _SEARCH_WORD_RE.findall(query)
+    if not words:
+        return None
+    clause, params = _filter_clause(date_from, date_to, customer, table="entries")
+    if _has_search_index(conn):
+        # Quote each word so punctuation is never read as FTS5 syntax, and
+        # match it as a prefix so partial words find results while typing.
+        match = " ".join(f'"{word}"*' for word in words)
+        sql = (" FROM entries_fts JOIN entry_rows AS entries ON entries.id = entries_fts.rowid"
+               + clause + " AND entries_fts MATCH ?")
+        return sql, params + [match]
+    sql = " FROM entry_rows AS entries" + clause
+    for word in words:
+        sql += " AND (entries.description LIKE ? OR entries.customer LIKE ?)"
+        params += [f"%{word}%", f"%{word}%"]
+    return sql, params
+
+
+@timed_query
+def search_entries(query, date_from=None, date_to=None, customer=None, limit=50, offset=0):
+    """Return entries matching the words in ``query``, best match first.
+
+    Every word must appear in the description or customer name, as a whole
+    word or a word prefix. Each entry gets a ``highlighted`` description
+    with matches wrapped in HIGHLIGHT_START and HIGHLIGHT_END.
+    """
+    conn = _connect()
+    found = _search_clause(conn, query, date_from, date_to, customer)
+    if found is None:
+        return []
+    sql, params = found
+    if _has_search_index(conn):
+        select = ("SELECT entries.*, highlight(entries_fts, 0, ?, ?) AS highlighted"
+                  + sql + " ORDER BY bm25(entries_fts, 2.0, 1.0), entries.date DESC")
+        params = [HIGHLIGHT_START, HIGHLIGHT_END] + params
+    else:
+        select = ("SELECT entries.*, entries.description AS highlighted"
+                  + sql + " ORDER BY entries.date DESC, entries.id DESC")
+    select += " LIMIT ? OFFSET ?"
+    params += [limit, offset]
+    with conn:
+        return [dict(row) for row in conn.execute(select, params).fetchall()]
 
 
+@timed_query
+def search_total(query, date_from=None, date_to=None, customer=None):
+    """Return {"count": ..., "hours": ...} for the entries matching a search."""
+    conn = _connect()
+    found = _search_clause(conn, query, date_from, date_to, customer)
+    if found is None:
+        return {"count": 0, "hours": 0}
+    sql, params = found
+    with conn:
+        row = conn.execute(
+            "SELECT COUNT(*) AS count, COALESCE(SUM(entries.hours), 0) AS hours" + sql, params
+        ).fetchone()
+    return {"count": row["count"], "hours": row["hours"]}
+
+
+@timed_query
+@_cached_lookup
 def get_customers():
+    """Return the names of customers that have entries, sorted."""
     with _connect() as conn:
         rows = conn.execute(
-            "SELECT DISTINCT customer FROM entries ORDER BY customer ASC"
+            """SELECT name FROM customers AS c
+               WHERE EXISTS (SELECT 1 FROM entries WHERE customer_id = c.id)
+               ORDER BY name ASC"""
         ).fetchall()
-        return [row["customer"] for row in rows]
+        return [row["name"] for row in rows]
 
 
+@timed_query
 def get_entry(entry_id):
     with _connect() as conn:
-        row = conn.execute("SELECT * FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        row = conn.execute("SELECT * FROM entry_rows WHERE id = ?", (entry_id,)).fetchone()
         return dict(row) if row else None
 
 
+@timed_query
+@_write
 def update_entry(entry_id, date_str, customer, hours, description):
     with _connect() as conn:
+        customer_id = _customer_id(conn, customer)
         conn.execute(
-            "UPDATE entries SET date=?, customer=?, hours=?, description=? WHERE id=?",
-            (date_str, customer, float(hours), description, entry_id),
+            """UPDATE entries SET date=?, customer_id=?, hours=?, description=?, content_hash=?,
+                                  updated_at=?
+               WHERE id=?""",
+            (date_str, customer_id, float(hours), description,
+             entry_hash(date_str, customer_id, hours, description), utc_now(), entry_id),
         )
+        _touch(conn)
 
 
+@timed_query
+@_write
 def delete_entry(entry_id):
     with _connect() as conn:
         conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+        _touch(conn)
+
+
+@timed_query
+def get_entries_by_id(entry_ids):
+    """Return {id: entry} for the given ids that exist."""
+    ids = list(entry_ids)
+    if not ids:
+        return {}
+    placeholders = ",".join("?" * len(ids))
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT * FROM entry_rows WHERE id IN ({placeholders})", ids
+        ).fetchall()
+    return {row["id"]: dict(row) for row in rows}
+
+
+@timed_query
+@_write
+def update_entries(rows):
+    """Update entries (dicts with an ``id``) in one transaction.
+
+    Returns the ids that did not exist; if there are any, nothing is changed.
+    """
+    missing = []
+    updated_at = utc_now()
+    with _connect() as conn:
+        for r in rows:
+            customer_id = _customer_id(conn, r["customer"])
+            cursor = conn.execute(
+                """UPDATE entries SET date=?, customer_id=?, hours=?, description=?, content_hash=?,
+                                      updated_at=?
+                   WHERE id=?""",
+                (r["date"], customer_id, float(r["hours"]), r["description"],
+                 entry_hash(r["date"], customer_id, r["hours"], r["description"]),
+                 updated_at, r["id"]),
+            )
+            if not cursor.rowcount:
+                missing.append(r["id"])
+        if missing:
+            conn.rollback()
+        elif rows:
+            _touch(conn)
+    return missing
+
 
+@timed_query
+@_write
+def delete_entries(entry_ids):
+    """Delete entries in one transaction.
 
+    Returns the ids that did not exist; if there are any, nothing is deleted.
+    """
+    missing = []
+    with _connect() as conn:
+        for entry_id in dict.fromkeys(entry_ids):
+            if not conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,)).rowcount:
+                missing.append(entry_id)
+        if missing:
+            conn.rollback()
+        elif entry_ids:
+            _touch(conn)
+    return missing
+
+
+@timed_query
+@_cached_lookup
 def get_months():
     """Return distinct months that have entries, newest first."""
     with _connect() as conn:
         rows = conn.execute(
-            "SELECT DISTINCT substr(date, 1, 7) AS month FROM entries ORDER BY month DESC"
+            "SELECT DISTINCT month FROM monthly_totals ORDER BY month DESC"
         ).fetchall()
     result = []
     for row in rows:
@@ -102,62 +945,553 @@ def get_months():
     return result
 
 
+@timed_query
 def get_monthly_summary(year_month):
     """Return total hours per customer for a given YYYY-MM."""
     with _connect() as conn:
         rows = conn.execute(
             """
-            SELECT customer, SUM(hours) AS total_hours
-            FROM entries
-            WHERE substr(date, 1, 7) = ?
-            GROUP BY customer
-            ORDER BY customer ASC
+            SELECT c.name AS customer, m.hours
+            FROM monthly_totals AS m JOIN customers AS c ON c.id = m.customer_id
+            WHERE m.month = ?
+            ORDER BY c.name ASC
             """,
             (year_month,),
         ).fetchall()
-    return [{"customer": row["customer"], "hours": row["total_hours"]} for row in rows]
+    return [{"customer": row["customer"], "hours": row["hours"]} for row in rows]
+
+
+@_write
+def rebuild_rollups():
+    """Regenerate monthly_totals from entries. Returns the number of rollup rows."""
+    with _connect() as conn:
+        conn.execute("DELETE FROM monthly_totals")
+        conn.execute("""
+            INSERT INTO monthly_totals (month, customer_id, hours, entries)
+            SELECT substr(date, 1, 7), customer_id, SUM(hours), COUNT(*)
+            FROM entries GROUP BY 1, 2
+        """)
+        _touch(conn)
+        return conn.execute("SELECT COUNT(*) FROM monthly_totals").fetchone()[0]
 
 
+@timed_query
+@_cached_lookup
 def get_managed_customers():
     with _connect() as conn:
         rows = conn.execute(
-            "SELECT name FROM customers ORDER BY name ASC"
+            "SELECT name FROM customers WHERE managed ORDER BY name ASC"
         ).fetchall()
         return [row["name"] for row in rows]
 
 
+@timed_query
+@_write
 def add_customer(name):
     created_at = datetime.now().isoformat(timespec="seconds")
     with _connect() as conn:
         conn.execute(
-            "INSERT OR IGNORE INTO customers (name, created_at) VALUES (?, ?)",
+            """INSERT INTO customers (name, created_at, managed) VALUES (?, ?, 1)
+               ON CONFLICT (name) DO UPDATE SET managed = 1""",
             (name, created_at),
         )
+        _touch(conn)
 
 
+@timed_query
+@_write
 def remove_customer(name):
+    """Take a customer off the managed list. Its entries are kept."""
+    with _connect() as conn:
+        conn.execute("UPDATE customers SET managed = 0 WHERE name = ?", (name,))
+        conn.execute(
+            """DELETE FROM customers WHERE name = ?
+               AND NOT EXISTS (SELECT 1 FROM entries WHERE customer_id = customers.id)""",
+            (name,),
+        )
+        _touch(conn)
+
+
+@timed_query
+def get_customer(name):
+    """Return {"id", "name", "managed", "entries"} for a customer, or None."""
+    with _connect() as conn:
+        row = conn.execute(
+            """SELECT id, name, managed,
+                      (SELECT COUNT(*) FROM entries WHERE customer_id = c.id) AS entries
+               FROM customers AS c WHERE name = ?""",
+            (name,),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+@timed_query
+@_write
+def rename_customer(old, new):
+    """Rename a customer in place. Returns the number of its entries.
+
+    Only the customer row changes: entries refer to it (and are hashed) by
+    id, so they are not rewritten. The rename itself goes into the change
+    feed, so the next sync export carries it instead of every entry.
+    Returns None if ``old`` does not exist. Renaming to an existing name
+    raises sqlite3.IntegrityError; use merge_customers for that.
+    """
+    with _connect() as conn:
+        row = conn.execute("SELECT id FROM customers WHERE name = ?", (old,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE customers SET name = ? WHERE id = ?", (new, row["id"]))
+        _record_rename(conn, old, new, utc_now(), "local")
+        count = conn.execute(
+            "SELECT COUNT(*) FROM entries WHERE customer_id = ?", (row["id"],)
+        ).fetchone()[0]
+        _touch(conn)
+        return count
+
+
+@timed_query
+@_write
+def merge_customers(source, target):
+    """Move all of ``source``'s entries to ``target`` and remove ``source``.
+
+    ``target`` is created if needed and stays managed if either was.
+    Returns the number of entries moved, or None if ``source`` does not exist.
+    """
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT id, managed FROM customers WHERE name = ?", (source,)
+        ).fetchone()
+        if row is None:
+            return None
+        target_id = _customer_id(conn, target)
+        if target_id == row["id"]:
+            return 0
+        moved = conn.execute(
+            """UPDATE entries SET customer_id = ?,
+                                  content_hash = entry_hash(date, ?, hours, description),
+                                  updated_at = ?
+               WHERE customer_id = ?""",
+            (target_id, target_id, utc_now(), row["id"]),
+        ).rowcount
+        conn.execute("DELETE FROM customers WHERE id = ?", (row["id"],))
+        if row["managed"]:
+            conn.execute("UPDATE customers SET managed = 1 WHERE id = ?", (target_id,))
+        _touch(conn)
+        return moved
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Names for the per-import staging tables (see import_entries)
+_import_ids = itertools.count(1)
+
+
+@timed_query
+def import_entries(rows, batch_size=1000):
+    """Insert rows, skipping exact duplicates. Returns (imported, skipped).
+
+    ``rows`` may be any iterable, such as a streaming CSV parser; it is read
+    on the caller's thread ``batch_size`` rows at a time. Each batch is
+    staged in a temp table keyed on the rows' content, which also drops
+    duplicates within the file. The staged rows are then copied into
+    entries in one statement, skipping content hashes already stored, so
+    either the whole import is saved or none of it. With the writer thread
+    running, each step is a short job on that thread, and parsing never
+    happens while the write lock is held.
+    """
+    table = f"import_staging_{next(_import_ids)}"
+    created_at = datetime.now().isoformat(timespec="seconds")
+    total = 0
+    try:
+        for batch in _batched(rows, batch_size):
+            total += len(batch)
+            _stage_import(table, batch, created_at)
+        imported = _finish_import(table, created_at) if total else 0
+    except BaseException:
+        try:
+            _drop_import(table)
+        except Exception:
+            pass  # the writer is gone, and its temp tables with it
+        raise
+    return imported, total - imported
+
+
+@_write
+def _stage_import(table, rows, created_at):
+    with _connect() as conn:
+        conn.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {table} (
+                row_key      TEXT PRIMARY KEY,
+                date         TEXT NOT NULL,
+                customer     TEXT NOT NULL,
+                hours        REAL NOT NULL,
+                description  TEXT NOT NULL,
+                created_at   TEXT NOT NULL
+            )
+        """)
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {table} VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (entry_hash(r["date"], r["customer"], r["hours"], r["description"]),
+                 r["date"], r["customer"], float(r["hours"]), r["description"],
+                 r.get("created_at") or created_at)
+                for r in rows
+            ],
+        )
+
+
+@_write
+def _finish_import(table, created_at):
+    """Copy the staged rows into entries and drop the staging table."""
+    with _connect() as conn:
+        conn.execute(f"""
+            INSERT INTO customers (name, created_at)
+            SELECT DISTINCT customer, ? FROM {table} WHERE true
+            ON CONFLICT (name) DO NOTHING
+        """, (created_at,))
+        cursor = conn.execute(f"""
+            INSERT INTO entries (date, customer_id, hours, description, created_at, content_hash,
+                                 updated_at, uid)
+            SELECT s.date, s.customer_id, s.hours, s.description, s.created_at, s.content_hash,
+                   ?, lower(hex(randomblob(16)))
+            FROM (SELECT st.rowid AS rowid, st.date, c.id AS customer_id, st.hours,
+                         st.description, st.created_at,
+                         entry_hash(st.date, c.id, st.hours, st.description) AS content_hash
+                  FROM {table} AS st JOIN customers AS c ON c.name = st.customer) AS s
+            WHERE NOT EXISTS (SELECT 1 FROM entries AS e WHERE e.content_hash = s.content_hash)
+            ORDER BY s.rowid
+        """, (utc_now(),))
+        imported = cursor.rowcount
+        conn.execute(f"DROP TABLE {table}")
+        if imported:
+            _touch(conn)
+    return imported
+
+
+@_write
+def _drop_import(table):
     with _connect() as conn:
-        conn.execute("DELETE FROM customers WHERE name = ?", (name,))
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
 
 
-def import_entries(rows):
-    """Insert rows, skipping exact duplicates. Returns (imported, skipped)."""
-    imported = 0
-    skipped = 0
+@timed_query
+def get_change_seq():
+    """Return the sequence number of the latest change (0 if none)."""
+    row = _connect().execute("SELECT MAX(seq) AS seq FROM changes").fetchone()
+    return row["seq"] or 0
+
+
+@timed_query
+def get_change_stats():
+    """Return {"seq": ..., "entries": ..., "tombstones": ...} for the change feed."""
+    row = _connect().execute("""
+        SELECT COALESCE(MAX(seq), 0) AS seq,
+               COALESCE(SUM(op = 'upsert'), 0) AS entries,
+               COALESCE(SUM(op = 'delete'), 0) AS tombstones
+        FROM changes
+    """).fetchone()
+    return dict(row)
+
+
+def iter_changes(since=0, batch_size=500):
+    """Yield changes made here after sequence number ``since``.
+
+    Only the latest change per entry is kept, so an entry edited many times
+    appears once. Upserts carry the entry's fields; deletes only the uid;
+    customer renames the old name as ``customer`` and the new one as
+    ``name``. Renames come first, oldest first, so the entries that follow
+    (which carry current names) find their customer; then everything else
+    in order. Changes received from other installations are left out.
+    """
+    cursor = _connect().execute("""
+        SELECT c.seq, c.op, c.uid, c.updated_at, c.name,
+               e.date, e.customer, e.hours, e.description, e.created_at
+        FROM changes AS c LEFT JOIN entry_rows AS e ON e.uid = c.uid
+        WHERE c.seq > ? AND c.origin = 'local'
+        ORDER BY c.op = 'rename' DESC, c.seq
+    """, (since,))
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                change = dict(row)
+                if change["op"] == "delete":
+                    change = {k: change[k] for k in ("seq", "op", "uid", "updated_at")}
+                elif change["op"] == "rename":
+                    change = {"seq": change["seq"], "op": "rename", "updated_at": change["updated_at"],
+                              "customer": change["uid"][len(_RENAME_KEY):], "name": change["name"]}
+                else:
+                    del change["name"]
+                yield change
+    finally:
+        cursor.close()
+
+
+@timed_query
+@_write
+def apply_changes(changes):
+    """Apply changes exported by another installation, in one transaction.
+
+    The most recent ``updated_at`` wins (ties go to the higher hash of the
+    fields by customer name, so both sides settle on the same row; customer
+    ids differ between installations), and a delete beats edits made
+    before it. An entry with an unknown uid that matches a local entry's
+    content, e.g. from importing the same CSV on both machines, is treated
+    as that entry: it takes over the remote uid instead of being added
+    twice. A customer rename applies if the old name exists here; if the
+    new name exists too, the entries move over without counting as edits.
+    Entries are checked like any other input; invalid ones are left out.
+    Returns counts of inserted, matched, updated, deleted, renamed, invalid
+    and skipped.
+    """
+    counts = {"inserted": 0, "matched": 0, "updated": 0, "deleted": 0, "renamed": 0,
+              "invalid": 0, "skipped": 0}
+    claimed = set()  # local ids already paired with a change in this delta
     with _connect() as conn:
-        for row in rows:
-            exists = conn.execute(
-                """SELECT id FROM entries
-                   WHERE date=? AND customer=? AND hours=? AND description=?""",
-                (row["date"], row["customer"], row["hours"], row["description"]),
+        for change in changes:
+            if change["op"] == "rename":
+                renamed = _apply_rename(conn, change["customer"], change["name"],
+                                        change["updated_at"])
+                counts["renamed" if renamed else "skipped"] += 1
+                continue
+            if change["op"] == "upsert":
+                fields, errors = validate_entry(change)
+                if errors:
+                    counts["invalid"] += 1
+                    continue
+                change = dict(change, **fields)
+            uid, stamp = change["uid"], change["updated_at"]
+            local = conn.execute(
+                "SELECT id, updated_at, date, customer, hours, description"
+                " FROM entry_rows WHERE uid = ?", (uid,)
             ).fetchone()
-            if exists:
-                skipped += 1
-            else:
-                created_at = row.get("created_at") or datetime.now().isoformat(timespec="seconds")
+            if change["op"] == "delete":
+                if local is not None and local["updated_at"] <= stamp:
+                    conn.execute("DELETE FROM entries WHERE id = ?", (local["id"],))
+                    _mark_synced(conn, uid)
+                    counts["deleted"] += 1
+                else:
+                    counts["skipped"] += 1
+                continue
+            hours = change["hours"]
+            known = conn.execute(
+                "SELECT id FROM customers WHERE name = ?", (change["customer"],)
+            ).fetchone()
+            customer_id = known["id"] if known else None
+            if local is None:
+                tombstone = conn.execute(
+                    "SELECT updated_at FROM changes WHERE uid = ? AND op = 'delete'", (uid,)
+                ).fetchone()
+                if tombstone is not None and tombstone["updated_at"] >= stamp:
+                    counts["skipped"] += 1
+                    continue
+                same = None
+                if customer_id is not None:
+                    digest = entry_hash(change["date"], customer_id, hours, change["description"])
+                    same = next((row for row in conn.execute(
+                        "SELECT id, uid, updated_at FROM entries WHERE content_hash = ? ORDER BY id",
+                        (digest,),
+                    ).fetchall() if row["id"] not in claimed), None)
+                if same is not None:
+                    conn.execute("DELETE FROM changes WHERE uid = ?", (same["uid"],))
+                    conn.execute(
+                        "UPDATE entries SET uid = ?, updated_at = ? WHERE id = ?",
+                        (uid, max(same["updated_at"], stamp), same["id"]),
+                    )
+                    claimed.add(same["id"])
+                    counts["matched"] += 1
+                else:
+                    if customer_id is None:
+                        customer_id = _customer_id(conn, change["customer"])
+                    cursor = conn.execute(
+                        """INSERT INTO entries (date, customer_id, hours, description, created_at,
+                                                content_hash, updated_at, uid)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (change["date"], customer_id, hours, change["description"],
+                         change.get("created_at") or stamp,
+                         entry_hash(change["date"], customer_id, hours, change["description"]),
+                         stamp, uid),
+                    )
+                    claimed.add(cursor.lastrowid)
+                    counts["inserted"] += 1
+            elif (stamp, _tie_break(change)) > (local["updated_at"], _tie_break(local)):
+                if customer_id is None:
+                    customer_id = _customer_id(conn, change["customer"])
                 conn.execute(
-                    "INSERT INTO entries (date, customer, hours, description, created_at) VALUES (?, ?, ?, ?, ?)",
-                    (row["date"], row["customer"], row["hours"], row["description"], created_at),
+                    """UPDATE entries SET date=?, customer_id=?, hours=?, description=?,
+                                          content_hash=?, updated_at=?
+                       WHERE id=?""",
+                    (change["date"], customer_id, hours, change["description"],
+                     entry_hash(change["date"], customer_id, hours, change["description"]),
+                     stamp, local["id"]),
                 )
-                imported += 1
-    return imported, skipped
+                claimed.add(local["id"])
+                counts["updated"] += 1
+            else:
+                claimed.add(local["id"])
+                counts["skipped"] += 1
+                continue
+            _mark_synced(conn, uid)
+        if any(counts[k] for k in ("inserted", "matched", "updated", "deleted", "renamed")):
+            _touch(conn)
+    return counts
+
+
+# Change feed uid of a customer rename, followed by the old name
+_RENAME_KEY = "customer:"
+
+
+def _record_rename(conn, old, new, stamp, origin):
+    key = _RENAME_KEY + old
+    conn.execute("DELETE FROM changes WHERE uid = ?", (key,))
+    conn.execute(
+        "INSERT INTO changes (uid, op, updated_at, origin, name) VALUES (?, 'rename', ?, ?, ?)",
+        (key, stamp, origin, new),
+    )
+
+
+def _apply_rename(conn, old, new, stamp):
+    """Rename customer ``old`` to ``new`` for a synced change. Returns False if
+    there is nothing to do."""
+    source = conn.execute("SELECT id, managed FROM customers WHERE name = ?", (old,)).fetchone()
+    if source is None or old == new:
+        return False
+    target = conn.execute("SELECT id FROM customers WHERE name = ?", (new,)).fetchone()
+    if target is None:
+        conn.execute("UPDATE customers SET name = ? WHERE id = ?", (new, source["id"]))
+    else:
+        # Entries under ``new`` arrived first: fold ``old`` into it. Moving
+        # entries re-records them in the change feed; keep their origin so
+        # they are not sent back as edits.
+        origins = conn.execute("""
+            SELECT c.uid, c.origin FROM changes AS c JOIN entries AS e ON e.uid = c.uid
+            WHERE e.customer_id = ?
+        """, (source["id"],)).fetchall()
+        conn.execute(
+            """UPDATE entries SET customer_id = ?,
+                                  content_hash = entry_hash(date, ?, hours, description)
+               WHERE customer_id = ?""",
+            (target["id"], target["id"], source["id"]),
+        )
+        conn.executemany("UPDATE changes SET origin = ? WHERE uid = ?",
+                         [(row["origin"], row["uid"]) for row in origins])
+        conn.execute("DELETE FROM customers WHERE id = ?", (source["id"],))
+        if source["managed"]:
+            conn.execute("UPDATE customers SET managed = 1 WHERE id = ?", (target["id"],))
+    _record_rename(conn, old, new, stamp, "sync")
+    return True
+
+
+def _tie_break(row):
+    """Order two versions of an entry with the same ``updated_at`` alike everywhere."""
+    return entry_hash(row["date"], row["customer"], row["hours"], row["description"])
+
+
+def _mark_synced(conn, uid):
+    """Flag the change just recorded for ``uid`` as received, not made here."""
+    conn.execute("UPDATE changes SET origin = 'sync' WHERE uid = ?", (uid,))
+
+
+def _bump(conn, name, amount=1):
+    conn.execute(
+        """INSERT INTO counters (name, value) VALUES (?, ?)
+           ON CONFLICT (name) DO UPDATE SET value = value + excluded.value""",
+        (name, amount),
+    )
+
+
+def get_counter(name):
+    row = _connect().execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+    return row["value"] if row else 0
+
+
+@_write
+def set_counter(name, value):
+    with _connect() as conn:
+        conn.execute(
+            """INSERT INTO counters (name, value) VALUES (?, ?)
+               ON CONFLICT (name) DO UPDATE SET value = excluded.value""",
+            (name, value),
+        )
+
+
+def _touch(conn):
+    """Record that entries or customers changed, in the caller's transaction."""
+    _bump(conn, "data_version")
+
+
+@timed_query
+def get_data_version():
+    """Return a number that increases whenever entries or customers are written.
+
+    It is stored in the database, so writes from the CLI and from other
+    processes are seen too (unlike ``PRAGMA data_version``, which is
+    per-connection and ignores the connection's own writes).
+    """
+    return get_counter("data_version")
+
+
+@timed_query
+@_write
+def cache_get(key):
+    """Return the cached extraction for ``key`` and mark it used, or None."""
+    with _connect() as conn:
+        row = conn.execute("SELECT result FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            _bump(conn, "extraction_cache_misses")
+            return None
+        conn.execute("UPDATE extraction_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        _bump(conn, "extraction_cache_hits")
+        import json
+        return json.loads(row["result"])
+
+
+@timed_query
+@_write
+def cache_put(key, result, max_entries):
+    """Store an extraction, evicting least recently used rows beyond ``max_entries``."""
+    import json
+    created_at = datetime.now().isoformat(timespec="seconds")
+    with _connect() as conn:
+        conn.execute(
+            """INSERT OR REPLACE INTO extraction_cache (key, result, created_at, last_used)
+               VALUES (?, ?, ?, ?)""",
+            (key, json.dumps(result), created_at, time.time()),
+        )
+        conn.execute(
+            """DELETE FROM extraction_cache WHERE key IN (
+                   SELECT key FROM extraction_cache
+                   ORDER BY last_used DESC LIMIT -1 OFFSET ?)""",
+            (max_entries,),
+        )
+
+
+@_write
+def cache_clear():
+    """Empty the extraction cache and reset its counters. Returns rows removed."""
+    with _connect() as conn:
+        removed = conn.execute("DELETE FROM extraction_cache").rowcount
+        conn.execute(
+            "DELETE FROM counters WHERE name IN ('extraction_cache_hits', 'extraction_cache_misses')"
+        )
+    return removed
+
+
+def cache_stats():
+    entries = _connect().execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+    return {
+        "entries": entries,
+        "hits": get_counter("extraction_cache_hits"),
+        "misses": get_counter("extraction_cache_misses"),
+    }
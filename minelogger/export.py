@@ -1,35 +1,62 @@
 import csv
 import io
+from operator import attrgetter, itemgetter
 
 
-def generate_csv(entries):
+FIELDNAMES = ["date", "customer", "hours", "description", "created_at"]
+
+
+def iter_csv(entries, chunk_rows=500):
+    """Yield the CSV for ``entries`` as text chunks of about ``chunk_rows`` rows.
+
+    Entries are ``db.Entry`` tuples (from ``db.iter_entries``) or dicts (from
+    ``db.get_entries``); the first one decides how fields are read.
+    """
     output = io.StringIO()
-    writer = csv.DictWriter(
-        output,
-        fieldnames=["date", "customer", "hours", "description", "created_at"],
-        extrasaction="ignore",
-    )
-    writer.writeheader()
-    writer.writerows(entries)
-    return output.getvalue()
+    writer = csv.writer(output)
+    writer.writerow(FIELDNAMES)
+    fields = None
+    pending = 0
+    for entry in entries:
+        if fields is None:
+            getter = attrgetter if isinstance(entry, tuple) else itemgetter
+            fields = getter(*FIELDNAMES)
+        writer.writerow(fields(entry))
+        pending += 1
+        if pending >= chunk_rows:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+            pending = 0
+    yield output.getvalue()
 
 
-def parse_csv(text):
-    """Parse CSV text into row dicts. Returns (rows, errors)."""
-    rows = []
-    errors = []
+def generate_csv(entries):
+    """Return the CSV for ``entries`` (``db.Entry`` tuples or dicts) as one string."""
+    return "".join(iter_csv(entries))
+
+
+def iter_csv_rows(lines, errors):
+    """Parse CSV lines lazily, yielding valid row dicts.
+
+    ``lines`` is any iterable of text lines, such as a file opened with
+    ``newline=""``. Problems are appended to ``errors`` as they are found;
+    a missing header or column stops parsing early.
+    """
     try:
-        reader = csv.DictReader(io.StringIO(text))
+        reader = csv.DictReader(lines)
         if reader.fieldnames is None:
-            return [], ["The file appears to be empty."]
+            errors.append("The file appears to be empty.")
+            return
         required = {"date", "customer", "hours", "description"}
         missing_cols = required - {f.strip().lower() for f in reader.fieldnames}
         if missing_cols:
-            return [], [f"Missing required columns: {', '.join(sorted(missing_cols))}"]
+            errors.append(f"Missing required columns: {', '.join(sorted(missing_cols))}")
+            return
         for i, row in enumerate(reader, start=2):
-            date = row.get("date", "").strip()
-            customer = row.get("customer", "").strip()
-            description = row.get("description", "").strip()
+            date = (row.get("date") or "").strip()
+            customer = (row.get("customer") or "").strip()
+            description = (row.get("description") or "").strip()
             if not date or not customer or not description:
                 errors.append(f"Row {i}: date, customer, and description are required.")
                 continue
@@ -40,13 +67,22 @@ def parse_csv(text):
             except (ValueError, TypeError):
                 errors.append(f"Row {i}: invalid hours value '{row.get('hours')}'.")
                 continue
-            rows.append({
+            yield {
                 "date": date,
                 "customer": customer,
                 "hours": hours,
                 "description": description,
-                "created_at": row.get("created_at", "").strip(),
-            })
+                "created_at": (row.get("created_at") or "").strip(),
+            }
+    except csv.Error as e:
+        errors.append(f"Could not parse CSV: {e}")
+
+
+def parse_csv(text):
+    """Parse CSV text into row dicts. Returns (rows, errors)."""
+    errors = []
+    try:
+        rows = list(iter_csv_rows(io.StringIO(text), errors))
     except Exception as e:
         return [], [f"Could not parse CSV: {e}"]
     return rows, errors
@@ -0,0 +1,247 @@
+"""Opt-in timing instrumentation, exposed in Prometheus text format on /metrics.
+
+Nothing is recorded until ``enable()`` is called (``minelogger ui --metrics``);
+until then the hooks return immediately. Measurements above the slow
+threshold are also logged to the "minelogger.slow" logger.
+"""
+import threading
+import time
+from functools import wraps
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = False
+_slow_seconds = None
+
+
+class Histogram:
+    """A labelled histogram with fixed buckets; safe to observe from any thread."""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(BUCKETS), 0, 0.0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += seconds
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for label_values, (buckets, count, total) in snapshot:
+            labels = _format_labels(self.labels, label_values)
+            for bound, value in zip(BUCKETS, buckets):
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound:g}"}} {value}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+            braces = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_count{braces} {count}")
+            lines.append(f"{self.name}_sum{braces} {total:.6f}")
+        return lines
+
+
+class Counter:
+    """A labelled, monotonically increasing counter."""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for label_values, value in snapshot:
+            lines.append(f"{self.name}{{{_format_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _format_labels(names, values):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+REQUEST_SECONDS = Histogram(
+    "minelogger_request_duration_seconds", "Time to build each web response.",
+    ("method", "route", "status"),
+)
+TEMPLATE_SECONDS = Histogram(
+    "minelogger_template_render_seconds", "Time spent rendering each template.", ("template",),
+)
+QUERY_SECONDS = Histogram(
+    "minelogger_db_query_duration_seconds", "Time spent in each database function.", ("function",),
+)
+OLLAMA_SECONDS = Histogram(
+    "minelogger_ollama_request_duration_seconds",
+    "Time until Ollama answered (or failed), by outcome.", ("path", "outcome"),
+)
+MODEL_EXTRACTION_SECONDS = Histogram(
+    "minelogger_model_extraction_seconds",
+    "Time for a complete extraction by the Ollama model, including streaming.", (),
+)
+EXTRACTIONS = Counter(
+    "minelogger_extractions_total", "Chat extractions by where the answer came from.", ("source",),
+)
+_METRICS = (
+    REQUEST_SECONDS, TEMPLATE_SECONDS, QUERY_SECONDS, OLLAMA_SECONDS,
+    MODEL_EXTRACTION_SECONDS, EXTRACTIONS,
+)
+
+
+def enable(slow_ms=None):
+    """Start recording. ``slow_ms`` logs anything slower than that many milliseconds."""
+    global _enabled, _slow_seconds
+    _enabled = True
+    _slow_seconds = slow_ms / 1000 if slow_ms else None
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Forget everything recorded so far."""
+    for metric in _METRICS:
+        metric.reset()
+
+
+def _check_slow(kind, name, seconds):
+    if _slow_seconds is not None and seconds >= _slow_seconds:
+        import logging  # only needed once metrics are on; keeps CLI startup lean
+        logging.getLogger("minelogger.slow").warning("slow %s %s took %.1f ms", kind, name, seconds * 1000)
+
+
+def observe_request(method, route, status, seconds):
+    if _enabled:
+        REQUEST_SECONDS.observe(seconds, method, route, status)
+        _check_slow("request", f"{method} {route}", seconds)
+
+
+def observe_ollama(path, outcome, seconds):
+    if _enabled:
+        OLLAMA_SECONDS.observe(seconds, path, outcome)
+        _check_slow("ollama", f"{path} ({outcome})", seconds)
+
+
+def observe_extraction(seconds):
+    if _enabled:
+        MODEL_EXTRACTION_SECONDS.observe(seconds)
+        _check_slow("extraction", "model", seconds)
+
+
+def count_extraction(source):
+    if _enabled:
+        EXTRACTIONS.inc(source)
+
+
+def timed_query(fn):
+    """Record how long each call to a db function takes, when enabled."""
+    name = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            QUERY_SECONDS.observe(seconds, name)
+            _check_slow("query", name, seconds)
+    return wrapper
+
+
+def init_app(app):
+    """Time requests and template rendering in ``app`` and serve /metrics."""
+    from flask import Response, abort, before_render_template, g, request, template_rendered
+
+    @app.before_request
+    def start_timer():
+        if _enabled:
+            g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def stop_timer(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            observe_request(request.method, route, response.status_code,
+                            time.perf_counter() - started)
+        return response
+
+    def render_started(sender, template, context, **extra):
+        if _enabled:
+            g.metrics_render_started = time.perf_counter()
+
+    def render_finished(sender, template, context, **extra):
+        started = g.pop("metrics_render_started", None)
+        if started is not None:
+            seconds = time.perf_counter() - started
+            TEMPLATE_SECONDS.observe(seconds, template.name)
+            _check_slow("template", template.name, seconds)
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        if not _enabled:
+            abort(404)
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def render():
+    """Return every metric in Prometheus text exposition format."""
+    from . import db
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    # The extraction cache counters are kept in the database, across restarts
+    stats = db.cache_stats()
+    for name, key, kind, help_text in (
+        ("minelogger_extraction_cache_hits_total", "hits", "counter", "Extraction cache hits."),
+        ("minelogger_extraction_cache_misses_total", "misses", "counter", "Extraction cache misses."),
+        ("minelogger_extraction_cache_entries", "entries", "gauge", "Cached extractions stored."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {stats[key]}"]
+    # The customer and month lists are cached in this process until data changes
+    name = "minelogger_lookup_cache_requests_total"
+    lines += [f"# HELP {name} Lookup list requests by function and cache result.",
+              f"# TYPE {name} counter"]
+    for function, counts in sorted(db.lookup_cache_stats().items()):
+        for result in ("hits", "misses"):
+            labels = _format_labels(("function", "result"), (function, result))
+            lines.append(f"{name}{{{labels}}} {counts[result]}")
+    return "\n".join(lines) + "\n"
@@ -1,31 +1,281 @@
+import hashlib
 import json
 import re
-from datetime import date
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
 
 import requests
 
+from . import db, metrics, rules
+
 MODEL = "llama3.2"
-_API_URL = "http://localhost:11434/api/chat"
+_BASE_URL = "http://localhost:11434"
+
+# Seconds to wait for the TCP connection, and for each read once connected
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 30.0
+
+# After this many consecutive connection failures, fail fast for COOLDOWN seconds
+FAILURE_THRESHOLD = 3
+COOLDOWN = 30.0
+PROBE_INTERVAL = 5.0
+
+# How long Ollama keeps the model loaded after a request (Ollama duration string)
+KEEP_ALIVE = "30m"
 
+# The system prompt never changes, so Ollama can reuse its evaluated prefix
+# between requests; everything that varies goes into the user message.
 _SYSTEM_PROMPT_TEMPLATE = """\
 You are a work-log entry extractor.
-Today's date is {today}.
-Known customers: {customers}. Match to this list if similar; otherwise use as spoken.
+Each request gives today's date, the known customers and the user's message.
+Match the customer to the known list if similar; otherwise use it as spoken.
 
 Extract the four fields and return ONLY valid JSON — no fences, no explanation:
 {{"date": "YYYY-MM-DD", "customer": "...", "hours": <float>, "description": "..."}}
 
 Rules:
 - date: use mentioned date; default to today if none
-- hours: "two hours"=2.0, "half a day"=4.0, "30 minutes"=0.5, "an hour and a half"=1.5
+- hours: {hour_examples}
 - description: concise task summary — do NOT repeat customer name or hours\
 """
 
+_SYSTEM_PROMPT = _SYSTEM_PROMPT_TEMPLATE.format(
+    hour_examples=", ".join(f'"{phrase}"={hours}' for phrase, hours in rules.HOUR_EXAMPLES.items())
+)
+
+_USER_PROMPT_TEMPLATE = """\
+Today's date is {today}.
+Known customers: {customers}.
+
+Message: {message}\
+"""
+
+
+# Fields that are already complete in a partially streamed JSON object
+_PARTIAL_STRING_RE = re.compile(r'"(date|customer|description)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_PARTIAL_HOURS_RE = re.compile(r'"hours"\s*:\s*"?(\d+(?:\.\d+)?)\s*[",}]')
+
+# Words whose meaning depends on which day it is ("friday", "last week") or
+# that pin a calendar date ("march", "3/14", "the 3rd"). Messages containing
+# them are cached per day; all others store the date as an offset from today.
+# Numbers followed by an hour unit ("1.5h") are durations, not dates.
+_DAY_SENSITIVE_RE = re.compile(
+    r"\b(mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun)(day)?\b"
+    r"|\b(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\b"
+    r"|\b(week|weekend|month|year|last|next)\b"
+    r"|\b\d{1,4}\s*[-/.]\s*\d{1,2}(\s*[-/.]\s*\d{1,4})?\b(?!\s*(h|hr|hrs|hours?)(\b|\d))"
+    r"|\b\d{1,2}(st|nd|rd|th)\b"
+)
+
+CACHE_MAX_ENTRIES = 1000
+
+# Only this many of the most similar customers are listed in the prompt
+PROMPT_CUSTOMER_LIMIT = 8
+
+# Upper bound on simultaneous requests to the local Ollama server in a batch
+MAX_CONCURRENT_REQUESTS = 3
+
+# Bullets and separators people use when pasting a list of entries
+_ITEM_SPLIT_RE = re.compile(r"[\n;]+")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+
+# Readiness details reported by status()
+_status = {"warm_up": "not started", "last_extraction_seconds": None}
+
 
 class OllamaError(Exception):
     pass
 
 
+class _SharedStream:
+    """Buffers one upstream stream so several readers can replay it."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def feed(self, iterable):
+        try:
+            for item in iterable:
+                with self.cond:
+                    self.items.append(item)
+                    self.cond.notify_all()
+        except Exception as exc:
+            self.error = exc if isinstance(exc, OllamaError) else OllamaError(str(exc))
+        finally:
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def __iter__(self):
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.items) and not self.done:
+                    self.cond.wait()
+                if i < len(self.items):
+                    item = self.items[i]
+                    i += 1
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            yield item
+
+
+class OllamaClient:
+    """Keep-alive HTTP client for Ollama with a circuit breaker and request coalescing.
+
+    Connection failures are counted; after ``FAILURE_THRESHOLD`` in a row the
+    circuit opens and calls fail immediately for ``COOLDOWN`` seconds while a
+    background thread probes the server and closes the circuit once it answers.
+    Identical concurrent requests share a single upstream call.
+    """
+
+    def __init__(self, base_url=_BASE_URL):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._inflight = {}
+        self._streams = {}
+
+    # ── circuit breaker ──
+
+    def _check_circuit(self):
+        with self._lock:
+            remaining = self._open_until - time.monotonic()
+        if remaining > 0:
+            raise OllamaError(
+                f"Ollama is not reachable; not retrying for another {remaining:.0f} s. "
+                "Is it running? Try: ollama serve"
+            )
+
+    def _record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures < FAILURE_THRESHOLD:
+                return
+            self._open_until = time.monotonic() + COOLDOWN
+            if self._probing:
+                return
+            self._probing = True
+        threading.Thread(target=self._probe, name="ollama-probe", daemon=True).start()
+
+    def _probe(self):
+        try:
+            while True:
+                time.sleep(PROBE_INTERVAL)
+                try:
+                    self.session.get(self.base_url + "/api/tags", timeout=CONNECT_TIMEOUT)
+                except requests.exceptions.RequestException:
+                    continue
+                self._record_success()
+                return
+        finally:
+            with self._lock:
+                self._probing = False
+
+    def circuit_state(self) -> str:
+        with self._lock:
+            if self._open_until > time.monotonic():
+                return "open"
+            return "half-open" if self._failures >= FAILURE_THRESHOLD else "closed"
+
+    # ── requests ──
+
+    def request(self, method: str, path: str, timeout=None, breaker=True,
+                **kwargs) -> requests.Response:
+        """Send a request to Ollama, raising OllamaError on any failure.
+
+        With ``breaker=False`` the circuit breaker is neither consulted nor
+        updated, for side requests such as status checks.
+        """
+        started = time.perf_counter()
+        outcome = "circuit_open"
+        record_success = self._record_success if breaker else _ignore
+        record_failure = self._record_failure if breaker else _ignore
+        try:
+            if breaker:
+                self._check_circuit()
+            timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+            try:
+                resp = self.session.request(method, self.base_url + path, timeout=timeout, **kwargs)
+                resp.raise_for_status()
+            except requests.exceptions.ConnectionError:
+                outcome = "unreachable"
+                record_failure()
+                raise OllamaError(
+                    "Cannot reach Ollama. Is it running? Try: ollama serve"
+                )
+            except requests.exceptions.Timeout:
+                outcome = "timeout"
+                record_success()  # it answered the connection, just slowly
+                raise OllamaError(f"Ollama request timed out after {READ_TIMEOUT:g} s.")
+            except requests.exceptions.HTTPError as exc:
+                outcome = "http_error"
+                record_success()
+                raise OllamaError(f"Ollama returned HTTP {exc.response.status_code}.")
+            outcome = "ok"
+            record_success()
+            return resp
+        finally:
+            metrics.observe_ollama(path, outcome, time.perf_counter() - started)
+
+    def coalesce(self, key, fn):
+        """Run ``fn()`` once for concurrent callers with the same ``key``; all get its result."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result()
+
+    def shared_stream(self, key, make_iterable):
+        """Iterate ``make_iterable()`` once in the background; concurrent callers share it."""
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is None:
+                shared = self._streams[key] = _SharedStream()
+
+                def run():
+                    try:
+                        shared.feed(make_iterable())
+                    finally:
+                        with self._lock:
+                            self._streams.pop(key, None)
+
+                threading.Thread(target=run, name="ollama-stream", daemon=True).start()
+        return iter(shared)
+
+
+def _ignore():
+    pass
+
+
+client = OllamaClient()
+
+
 def _strip_fences(text: str) -> str:
     """Remove accidental ``` or ```json wrappers from model output."""
     text = text.strip()
@@ -34,44 +284,143 @@ def _strip_fences(text: str) -> str:
     return text.strip()
 
 
-def extract_entry(message: str, customers: list) -> dict:
-    """Call local Ollama to extract structured work-log fields from free text.
+def _shortlist(message: str, customers: list) -> list:
+    """The customers worth listing in the prompt for this message."""
+    return rules.customer_index(customers).top(message, PROMPT_CUSTOMER_LIMIT)
 
-    Returns a dict with keys: date, customer, hours, description.
-    Raises OllamaError on any failure.
-    """
+
+def _snap_customer(data: dict, customers: list) -> dict:
+    if isinstance(data.get("customer"), str):
+        data["customer"] = rules.customer_index(customers).canonical(data["customer"])
+    return data
+
+
+def configure(keep_alive=None, connect_timeout=None, read_timeout=None):
+    """Override module settings, e.g. from CLI options."""
+    global KEEP_ALIVE, CONNECT_TIMEOUT, READ_TIMEOUT
+    if connect_timeout is not None:
+        CONNECT_TIMEOUT = connect_timeout
+    if read_timeout is not None:
+        READ_TIMEOUT = read_timeout
+    if keep_alive is not None:
+        # Ollama wants bare numbers (seconds, or -1 for "forever") as JSON numbers
+        KEEP_ALIVE = int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive
+
+
+def _build_payload(message: str, customers: list, stream: bool) -> dict:
     today = date.today().isoformat()
     customer_list = ", ".join(customers) if customers else "(none)"
-    system_prompt = _SYSTEM_PROMPT_TEMPLATE.format(today=today, customers=customer_list)
+    user_prompt = _USER_PROMPT_TEMPLATE.format(
+        today=today, customers=customer_list, message=message
+    )
+    return {
+        "model": MODEL,
+        "stream": stream,
+        "format": "json",
+        "keep_alive": KEEP_ALIVE,
+        "messages": [
+            {"role": "system", "content": _SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+    }
 
+
+def warm_up() -> None:
+    """Load the model and evaluate the static system prompt ahead of the first request.
+
+    Failures are recorded in status() rather than raised.
+    """
+    _status["warm_up"] = "running"
     payload = {
         "model": MODEL,
         "stream": False,
-        "format": "json",
+        "keep_alive": KEEP_ALIVE,
+        "options": {"num_predict": 1},
         "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": message},
+            {"role": "system", "content": _SYSTEM_PROMPT},
+            {"role": "user", "content": "ping"},
         ],
     }
-
     try:
-        resp = requests.post(_API_URL, json=payload, timeout=30)
-        resp.raise_for_status()
-    except requests.exceptions.ConnectionError:
-        raise OllamaError(
-            "Cannot reach Ollama. Is it running? Try: ollama serve"
-        )
-    except requests.exceptions.Timeout:
-        raise OllamaError("Ollama request timed out after 30 s.")
-    except requests.exceptions.HTTPError as exc:
-        raise OllamaError(f"Ollama returned HTTP {exc.response.status_code}.")
+        client.request("POST", "/api/chat", json=payload)
+    except OllamaError as exc:
+        _status["warm_up"] = f"failed: {exc}"
+    else:
+        _status["warm_up"] = "done"
+
+
+def warm_up_in_background() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="ollama-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def status() -> dict:
+    """Report whether the model is loaded and how long the last extraction took.
+
+    The check does not count toward the circuit breaker, and is skipped
+    while the circuit is open.
+    """
+    loaded = None
+    circuit = client.circuit_state()
+    reachable = False
+    if circuit != "open":
+        try:
+            resp = client.request("GET", "/api/ps", timeout=(CONNECT_TIMEOUT, 2), breaker=False)
+            names = [m.get("name", "") for m in resp.json().get("models", [])]
+            loaded = any(name.split(":")[0] == MODEL for name in names)
+            reachable = True
+        except (OllamaError, ValueError):
+            pass
+    return {
+        "model": MODEL,
+        "reachable": reachable,
+        "loaded": loaded,
+        "circuit": circuit,
+        "keep_alive": KEEP_ALIVE,
+        "warm_up": _status["warm_up"],
+        "last_extraction_seconds": _status["last_extraction_seconds"],
+    }
+
+
+def _request_key(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
 
+
+def _chat(payload: dict) -> str:
+    """Send a non-streaming chat request and return the raw model output."""
+    resp = client.request("POST", "/api/chat", json=payload)
     try:
         body = resp.json()
-        raw = body["message"]["content"]
+        return body["message"]["content"]
     except (KeyError, ValueError) as exc:
         raise OllamaError(f"Unexpected response from Ollama: {exc}")
 
+
+def _chat_stream(payload: dict):
+    """Send a streaming chat request, yielding the model output as it arrives."""
+    resp = client.request("POST", "/api/chat", json=payload, stream=True)
+    with resp:
+        try:
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise OllamaError(f"Ollama error: {chunk['error']}")
+                text = chunk.get("message", {}).get("content", "")
+                if text:
+                    yield text
+                if chunk.get("done"):
+                    break
+        except requests.exceptions.RequestException as exc:
+            raise OllamaError(f"Lost connection to Ollama while streaming: {exc}")
+        except (ValueError, AttributeError) as exc:
+            raise OllamaError(f"Unexpected response from Ollama: {exc}")
+
+
+def _parse_result(raw: str) -> dict:
+    """Validate the model's final output and return the entry fields."""
     cleaned = _strip_fences(raw)
 
     try:
@@ -92,3 +441,198 @@ def extract_entry(message: str, customers: list) -> dict:
         raise OllamaError(f"Model returned non-positive hours: {data['hours']}")
 
     return data
+
+
+def _partial_fields(text: str) -> dict:
+    """Pick out the fields that are already complete in partial model output.
+
+    A field whose text does not decode yet (for instance a cut-off escape
+    such as ``\\u00``) is left out until more output arrives.
+    """
+    fields = {}
+    for m in _PARTIAL_STRING_RE.finditer(text):
+        try:
+            fields[m.group(1)] = json.loads(f'"{m.group(2)}"')
+        except ValueError:
+            continue
+    m = _PARTIAL_HOURS_RE.search(text)
+    if m:
+        fields["hours"] = float(m.group(1))
+    return fields
+
+
+def _normalize(message: str) -> str:
+    return " ".join(message.lower().split()).strip(" .!?")
+
+
+def _cache_key(message: str, customers: list):
+    """Return ``(key, per_day)`` for the extraction cache.
+
+    Day-sensitive messages include today's date in the key so they are never
+    served on another day; for the rest the cached date is stored as an
+    offset from today and re-anchored on a hit.
+    """
+    normalized = _normalize(message)
+    per_day = bool(_DAY_SENSITIVE_RE.search(normalized))
+    parts = [MODEL, normalized, "\x1e".join(sorted(customers))]
+    if per_day:
+        parts.append(date.today().isoformat())
+    key = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return key, per_day
+
+
+def _cache_lookup(message: str, customers: list):
+    key, per_day = _cache_key(message, customers)
+    cached = db.cache_get(key)
+    if cached is None:
+        return None
+    if not per_day:
+        offset = cached.pop("date_offset")
+        cached["date"] = (date.today() + timedelta(days=offset)).isoformat()
+    cached["source"] = "cache"
+    metrics.count_extraction("cache")
+    return cached
+
+
+def _cache_store(message: str, customers: list, data: dict):
+    key, per_day = _cache_key(message, customers)
+    stored = {k: data[k] for k in ("date", "customer", "hours", "description")}
+    if not per_day:
+        try:
+            offset = (date.fromisoformat(stored.pop("date")) - date.today()).days
+        except (TypeError, ValueError):
+            return  # unparseable date: not worth caching
+        stored["date_offset"] = offset
+    db.cache_put(key, stored, CACHE_MAX_ENTRIES)
+
+
+def _fast_path(message: str, customers: list):
+    """Return the rule-based result if it is confident and complete, else None."""
+    result = rules.parse(message, customers)
+    # Hours, customer and a clean date alone reach the threshold ("2h Acme")
+    if result["confidence"] < rules.CONFIDENCE_THRESHOLD or not result["description"]:
+        return None
+    result["source"] = "rules"
+    metrics.count_extraction("rules")
+    return result
+
+
+def extract_entry(message: str, customers: list, use_cache: bool = True,
+                  fast_path: bool = True) -> dict:
+    """Extract structured work-log fields from free text.
+
+    Plain messages are answered by the local rules when ``fast_path`` is set;
+    the rest go to the cache and then to the local Ollama model.
+
+    Returns a dict with keys: date, customer, hours, description, and source
+    ("rules", "cache" or "model"). Results are cached unless ``use_cache`` is
+    False. Raises OllamaError on any failure.
+    """
+    if fast_path:
+        quick = _fast_path(message, customers)
+        if quick is not None:
+            return quick
+    shortlist = _shortlist(message, customers)
+    if use_cache:
+        cached = _cache_lookup(message, shortlist)
+        if cached is not None:
+            return cached
+
+    started = time.perf_counter()
+    payload = _build_payload(message, shortlist, stream=False)
+    raw = client.coalesce(_request_key(payload), lambda: _chat(payload))
+
+    data = _snap_customer(_parse_result(raw), customers)
+    _status["last_extraction_seconds"] = round(time.perf_counter() - started, 3)
+    metrics.observe_extraction(time.perf_counter() - started)
+    if use_cache:
+        _cache_store(message, shortlist, data)
+    data["source"] = "model"
+    metrics.count_extraction("model")
+    return data
+
+
+def stream_extract(message: str, customers: list, use_cache: bool = True,
+                   fast_path: bool = True):
+    """Stream an extraction, yielding ``(event, data)`` pairs as output arrives.
+
+    Events are ``"token"`` (``{"text": ..., "chars": ...}``), ``"partial"``
+    (the fields completed so far, whenever they change) and finally
+    ``"result"`` with the validated entry. A rules or cache answer yields only
+    the result. Raises OllamaError on any failure.
+    """
+    if fast_path:
+        quick = _fast_path(message, customers)
+        if quick is not None:
+            yield "result", quick
+            return
+    shortlist = _shortlist(message, customers)
+    if use_cache:
+        cached = _cache_lookup(message, shortlist)
+        if cached is not None:
+            yield "result", cached
+            return
+
+    started = time.perf_counter()
+    payload = _build_payload(message, shortlist, stream=True)
+    pieces = []
+    chars = 0
+    last_partial = {}
+    for text in client.shared_stream(_request_key(payload), lambda: _chat_stream(payload)):
+        pieces.append(text)
+        chars += len(text)
+        yield "token", {"text": text, "chars": chars}
+        partial = _partial_fields("".join(pieces))
+        if partial != last_partial:
+            last_partial = partial
+            yield "partial", partial
+
+    data = _snap_customer(_parse_result("".join(pieces)), customers)
+    _status["last_extraction_seconds"] = round(time.perf_counter() - started, 3)
+    metrics.observe_extraction(time.perf_counter() - started)
+    if use_cache:
+        _cache_store(message, shortlist, data)
+    data["source"] = "model"
+    metrics.count_extraction("model")
+    yield "result", data
+
+
+def split_entries(text: str) -> list:
+    """Split pasted text into one candidate message per line or ';'-separated item."""
+    items = []
+    for piece in _ITEM_SPLIT_RE.split(text):
+        piece = _BULLET_RE.sub("", piece).strip()
+        if piece:
+            items.append(piece)
+    return items
+
+
+def extract_batch(items: list, customers: list, use_cache: bool = True,
+                  max_concurrent: int = MAX_CONCURRENT_REQUESTS) -> list:
+    """Extract entries for several messages, in input order.
+
+    Messages the local rules can answer are handled inline; the rest run
+    concurrently with at most ``max_concurrent`` requests in flight to Ollama.
+    Returns ``[{"input": ..., "entry": dict or None, "error": str or None}]``.
+    """
+    results = [{"input": item, "entry": None, "error": None} for item in items]
+    pending = []
+    for result in results:
+        quick = _fast_path(result["input"], customers)
+        if quick is not None:
+            result["entry"] = quick
+        else:
+            pending.append(result)
+
+    def run(result):
+        try:
+            result["entry"] = extract_entry(
+                result["input"], customers, use_cache=use_cache, fast_path=False
+            )
+        except OllamaError as exc:
+            result["error"] = str(exc)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrent)) as pool:
+            list(pool.map(run, pending))
+    return results
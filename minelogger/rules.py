@@ -0,0 +1,314 @@
+"""Local, model-free extraction for plainly worded chat messages.
+
+``parse`` handles messages like "2h standup with Acme yesterday" without a
+round-trip to Ollama and reports how confident it is, so only the messages
+it cannot read reliably are sent to the model.
+"""
+import re
+from collections import Counter
+from datetime import date, timedelta
+from functools import lru_cache
+
+# The hour conventions given to the model in the extraction prompt. The parser
+# below understands the same phrases, so both paths agree on them.
+HOUR_EXAMPLES = {
+    "two hours": 2.0,
+    "half a day": 4.0,
+    "30 minutes": 0.5,
+    "an hour and a half": 1.5,
+}
+
+# Results at or above this score are used without asking the model, as long
+# as they found a description.
+CONFIDENCE_THRESHOLD = 0.8
+
+# Customers checked for an exact name match, after ranking by similarity
+CANDIDATE_LIMIT = 20
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11,
+    "twelve": 12, "fifteen": 15, "twenty": 20, "thirty": 30, "forty": 40,
+    "forty-five": 45, "sixty": 60, "ninety": 90,
+}
+_NUM = r"\d+(?:[.,]\d+)?|" + "|".join(sorted(_NUMBER_WORDS, key=len, reverse=True))
+
+_FIXED_HOURS = [
+    (re.compile(r"\b(?:a\s+)?half(?:\s+a|-)?\s*day\b"), 4.0),
+    (re.compile(r"\b(?:a\s+)?(?:full|whole)\s+day\b|\ball\s+day\b"), 8.0),
+    (re.compile(r"\bhalf\s+an?\s+hour\b"), 0.5),
+    (re.compile(r"\b(?:a\s+)?quarter\s+of\s+an\s+hour\b"), 0.25),
+]
+_HOURS_RE = re.compile(
+    rf"\b(?P<hours>{_NUM})\s*(?:h|hr|hrs|hours?)(?:\b|(?=\d))"
+    r"(?P<half>\s+and\s+a\s+half)?"
+    rf"(?:\s*(?:and\s+)?(?P<minutes>{_NUM})\s*(?:m|min|mins|minutes?)\b|\s*(?P<bare>[0-5]\d)\b)?"
+)
+# "2h 20 tickets": minutes or a count? The hours are used, but not without the model
+_SPACED_MINUTES_RE = re.compile(r"\s[0-5]\d$")
+_HOURS_DECIMAL_RE = re.compile(rf"\b(?P<hours>{_NUM})\s+and\s+a\s+half\s+hours?\b")
+_MINUTES_RE = re.compile(rf"\b(?P<minutes>{_NUM})\s*(?:m|min|mins|minutes?)\b")
+
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+# Full day names anywhere; short forms ("sat", "wed") only as "Sat:" or "on sat"
+_WEEKDAY_RE = re.compile(
+    r"\b(?:(?:last|on|this)\s+)?(?P<day>" + "|".join(_WEEKDAYS) + r")\b:?"
+    r"|\b(?:(?:last|on)\s+(?P<short>mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun)\b:?"
+    r"|(?P<label>mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun):)"
+)
+_MONTHS = [
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+]
+_MONTH = (
+    r"(?P<month>" + "|".join(_MONTHS) + "|"
+    + "|".join(m[:3] for m in _MONTHS if m != "may") + r"|sept)\.?(?!\w)"
+)
+_DATE_PATTERNS = [
+    re.compile(r"\b(?:on\s+)?(?P<iso>\d{4}-\d{2}-\d{2})\b"),
+    re.compile(rf"\b(?:on\s+)?(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTH}\b"),
+    re.compile(rf"\b(?:on\s+)?{_MONTH}\s+(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\b"),
+]
+_RELATIVE_RE = re.compile(
+    r"\b(?P<word>today|this\s+(?:morning|afternoon|evening)|tonight|yesterday)\b"
+    r"|\b(?P<ago>\d+|" + "|".join(_NUMBER_WORDS) + r")\s+days?\s+ago\b"
+)
+# Date words the rules above do not resolve; their presence means the model should decide.
+_UNRESOLVED_DATE_RE = re.compile(r"\b(?:week|weekend|month|next|tomorrow|last)\b")
+
+# Words left dangling once the hours, date and customer are cut out
+_LEADING_FILLER_RE = re.compile(
+    r"^(?:(?:i|we)\s+)?(?:spent|worked|did|had|logged|log)\b|^(?:on|for|with|at)\b",
+    re.IGNORECASE,
+)
+_TRAILING_FILLER_RE = re.compile(r"\b(?:for|with|on|at|from|of)$", re.IGNORECASE)
+_WORD_RE = re.compile(r"\w+")
+_DANGLING_RE = re.compile(r"\b(?:for|with|on|at|from|of)\s+(?=[,;.]|(?:for|with|on|at)\b)", re.IGNORECASE)
+
+
+def _number(text):
+    text = text.lower()
+    if text in _NUMBER_WORDS:
+        return float(_NUMBER_WORDS[text])
+    return float(text.replace(",", "."))
+
+
+def find_hours(text):
+    """Return a list of (hours, span) for every hours expression in ``text``."""
+    lowered = text.lower()
+    found = []
+    taken = []
+
+    def free(span):
+        return all(span[1] <= a or span[0] >= b for a, b in taken)
+
+    for pattern, hours in _FIXED_HOURS:
+        for m in pattern.finditer(lowered):
+            if free(m.span()):
+                found.append((hours, m.span()))
+                taken.append(m.span())
+    for m in _HOURS_DECIMAL_RE.finditer(lowered):
+        if free(m.span()):
+            found.append((_number(m.group("hours")) + 0.5, m.span()))
+            taken.append(m.span())
+    for m in _HOURS_RE.finditer(lowered):
+        if free(m.span()):
+            hours = _number(m.group("hours"))
+            if m.group("half"):
+                hours += 0.5
+            minutes = m.group("minutes") or m.group("bare")
+            if minutes:
+                hours += _number(minutes) / 60
+            found.append((round(hours, 2), m.span()))
+            taken.append(m.span())
+    for m in _MINUTES_RE.finditer(lowered):
+        if free(m.span()):
+            found.append((round(_number(m.group("minutes")) / 60, 2), m.span()))
+            taken.append(m.span())
+    return found
+
+
+def find_date(text, today=None):
+    """Return ``(iso_date, span)`` for the first date expression, or ``(None, None)``."""
+    today = today or date.today()
+    lowered = text.lower()
+    for pattern in _DATE_PATTERNS:
+        m = pattern.search(lowered)
+        if not m:
+            continue
+        try:
+            if m.groupdict().get("iso"):
+                return date.fromisoformat(m.group("iso")).isoformat(), m.span()
+            month = [name[:3] for name in _MONTHS].index(m.group("month")[:3]) + 1
+            found = date(today.year, month, int(m.group("day")))
+        except ValueError:
+            continue
+        if found > today:
+            found = found.replace(year=today.year - 1)
+        return found.isoformat(), m.span()
+    m = _RELATIVE_RE.search(lowered)
+    if m:
+        if m.group("ago"):
+            days = int(_number(m.group("ago")))
+        else:
+            days = 1 if m.group("word") == "yesterday" else 0
+        return (today - timedelta(days=days)).isoformat(), m.span()
+    m = _WEEKDAY_RE.search(lowered)
+    if m:
+        day = m.group("day") or m.group("short") or m.group("label")
+        target = next(i for i, name in enumerate(_WEEKDAYS) if name.startswith(day[:3]))
+        back = (today.weekday() - target) % 7
+        return (today - timedelta(days=back)).isoformat(), m.span()
+    return None, None
+
+
+def _trigrams(text):
+    padded = " " + " ".join(_WORD_RE.findall(text.lower())) + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CustomerIndex:
+    """Trigram index over customer names for ranking them against a message."""
+
+    def __init__(self, customers):
+        self.customers = list(customers)
+        self._grams = [_trigrams(name) for name in self.customers]
+        self._postings = {}
+        for i, grams in enumerate(self._grams):
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+
+    def _overlap(self, text):
+        counts = Counter()
+        for gram in _trigrams(text):
+            counts.update(self._postings.get(gram, ()))
+        return counts
+
+    def top(self, message, k):
+        """Return up to ``k`` customers whose names best appear in ``message``."""
+        counts = self._overlap(message)
+        scored = [
+            (count / len(self._grams[i]), self.customers[i])
+            for i, count in counts.items()
+            if count / len(self._grams[i]) >= 0.3
+        ]
+        scored.sort(key=lambda pair: (-pair[0], pair[1].lower()))
+        return [name for _, name in scored[:k]]
+
+    def canonical(self, name, threshold=0.6):
+        """Snap ``name`` to the most similar known customer, or return it unchanged."""
+        grams = _trigrams(name)
+        if not grams:
+            return name
+        best, best_score = name, 0.0
+        containing = []
+        for i, count in self._overlap(name).items():
+            score = count / len(grams | self._grams[i])
+            if score > best_score:
+                best, best_score = self.customers[i], score
+            if count / len(grams) >= 0.9:
+                containing.append(self.customers[i])
+        if best_score >= threshold:
+            return best
+        # A shortened form of exactly one name ("Northwind" for "Northwind Traders")
+        if len(containing) == 1:
+            return containing[0]
+        return name
+
+
+@lru_cache(maxsize=4)
+def _cached_index(customers):
+    return CustomerIndex(customers)
+
+
+def customer_index(customers):
+    """Return a (cached) CustomerIndex for this customer list."""
+    return _cached_index(tuple(customers))
+
+
+def find_customers(text, customers):
+    """Return ``[(customer, span)]`` for known customers named in ``text``, longest first."""
+    lowered = text.lower()
+    found = []
+    for name in sorted(customers, key=len, reverse=True):
+        m = re.search(rf"(?<!\w){re.escape(name.lower())}(?!\w)", lowered)
+        if m and all(m.end() <= a or m.start() >= b for _, (a, b) in found):
+            found.append((name, m.span()))
+    return found
+
+
+def _description(text, spans):
+    """Remove the matched spans and filler words, leaving the task summary."""
+    pieces = []
+    last = 0
+    for start, end in sorted(spans):
+        pieces.append(text[last:start])
+        last = end
+    pieces.append(text[last:])
+    desc = " ".join(" ".join(pieces).split())
+    previous = None
+    while desc != previous:
+        previous = desc
+        desc = desc.strip(" ,;:.-")
+        desc = _LEADING_FILLER_RE.sub("", desc).strip()
+        desc = _TRAILING_FILLER_RE.sub("", desc).strip()
+        desc = " ".join(_DANGLING_RE.sub("", desc).split())
+    return desc[:1].upper() + desc[1:]
+
+
+def parse(message, customers, today=None):
+    """Extract entry fields with local rules.
+
+    Returns a dict with date, customer, hours, description (any of which may
+    be None) and ``confidence`` between 0 and 1.
+    """
+    today = today or date.today()
+    spans = []
+    confidence = 0.0
+
+    hours_found = find_hours(message)
+    hours = None
+    if len(hours_found) == 1:
+        hours, span = hours_found[0]
+        spans.append(span)
+        if _SPACED_MINUTES_RE.search(message[span[0]:span[1]]):
+            confidence += 0.1
+        elif hours > 0:
+            confidence += 0.4
+    elif hours_found:
+        confidence -= 0.3  # several durations: let the model work out the total
+
+    candidates = customer_index(customers).top(message, CANDIDATE_LIMIT)
+    matched = find_customers(message, candidates)
+    customer = None
+    if len(matched) == 1:
+        customer, span = matched[0]
+        spans.append(span)
+        confidence += 0.3
+    elif matched:
+        confidence -= 0.2
+
+    date_str, span = find_date(message, today)
+    if span:
+        spans.append(span)
+    # Leftover date words we could not resolve make the date unreliable
+    remaining = message.lower()
+    for start, end in sorted(spans, reverse=True):
+        remaining = remaining[:start] + " " + remaining[end:]
+    if _UNRESOLVED_DATE_RE.search(remaining):
+        confidence -= 0.3
+    else:
+        confidence += 0.1
+    date_str = date_str or today.isoformat()
+
+    description = _description(message, spans) or None
+    if description and len(description) >= 3:
+        confidence += 0.2
+
+    return {
+        "date": date_str,
+        "customer": customer,
+        "hours": hours,
+        "description": description,
+        "confidence": round(max(0.0, min(confidence, 1.0)), 2),
+    }
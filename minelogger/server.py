@@ -1,8 +1,74 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, make_response, jsonify
+from flask import (
+    Flask, Response, render_template, request, redirect, url_for, flash, jsonify,
+    make_response, session,
+)
 from datetime import date
-from . import db
-from .export import generate_csv, parse_csv
-from .ollama import extract_entry, OllamaError
+from functools import wraps
+import time
+from markupsafe import Markup, escape
+from . import db, metrics
+from .api import api
+from .validation import validate_entry, format_cursor, parse_cursor
+from .export import iter_csv, iter_csv_rows
+from .ollama import extract_entry, extract_batch, split_entries, stream_extract, OllamaError
+from .ollama import status as ollama_status
+
+PAGE_SIZES = (25, 50, 100, 200)
+DEFAULT_PAGE_SIZE = 50
+MAX_IMPORT_ERRORS = 10
+MAX_BATCH_ITEMS = 100
+
+# Part of every ETag, so pages cached by the browser are re-rendered after
+# a restart (for instance with new templates) even if no data changed.
+_STARTED = format(int(time.time()), "x")
+
+
+def _conditional(view):
+    """Answer GET requests with 304 Not Modified while the data is unchanged.
+
+    The ETag is derived from ``db.get_data_version()``, so the view's queries
+    and template are skipped entirely when the browser's copy is current.
+    Pages with pending flash messages are always rendered.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "GET" or "_flashes" in session:
+            return view(*args, **kwargs)
+        etag = f"{_STARTED}-{db.get_data_version()}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # Let the browser cache the page but always revalidate it
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
+def _log_page(date_from, date_to, customer, per_page, after, before, link_args):
+    """One page of the log by keyset cursor. Returns (entries, prev_url, next_url)."""
+    # Fetch one extra row to learn whether another page exists
+    entries = db.get_entries(
+        date_from=date_from, date_to=date_to, customer=customer,
+        limit=per_page + 1, after=after, before=before,
+    )
+    if before:
+        has_prev = len(entries) > per_page
+        entries = entries[-per_page:]
+        has_next = True
+    else:
+        has_next = len(entries) > per_page
+        entries = entries[:per_page]
+        has_prev = after is not None
+    prev_url = next_url = None
+    if entries and has_prev:
+        prev_url = url_for("view_log", before=format_cursor(entries[0]), **link_args)
+    if entries and has_next:
+        next_url = url_for("view_log", after=format_cursor(entries[-1]), **link_args)
+    return entries, prev_url, next_url
 
 
 def create_app():
@@ -15,6 +81,15 @@ def create_app():
     app.secret_key = "minelogger-secret"
 
     db.init_db()
+    app.register_blueprint(api)
+    metrics.init_app(app)
+
+    @app.template_filter("highlight")
+    def highlight(text):
+        """Render search matches marked by db.search_entries as <mark>."""
+        return (escape(text)
+                .replace(db.HIGHLIGHT_START, Markup("<mark>"))
+                .replace(db.HIGHLIGHT_END, Markup("</mark>")))
 
     @app.route("/")
     def index():
@@ -23,28 +98,12 @@ def create_app():
     @app.route("/add", methods=["GET", "POST"])
     def add_entry():
         if request.method == "POST":
-            date_str = request.form.get("date") or date.today().isoformat()
-            customer = request.form.get("customer", "").strip()
-            hours = request.form.get("hours", "")
-            description = request.form.get("description", "").strip()
-
-            errors = []
-            if not customer:
-                errors.append("Customer is required.")
-            if not description:
-                errors.append("Description is required.")
-            try:
-                hours = float(hours)
-                if hours <= 0:
-                    errors.append("Hours must be positive.")
-            except (ValueError, TypeError):
-                errors.append("Hours must be a number.")
-
+            entry, errors = validate_entry(request.form, default_date=date.today().isoformat())
             if errors:
                 for e in errors:
                     flash(e, "error")
             else:
-                db.add_entry(date_str, customer, hours, description)
+                db.add_entry(entry["date"], entry["customer"], entry["hours"], entry["description"])
                 flash("Entry added.", "success")
                 return redirect(url_for("add_entry"))
 
@@ -53,12 +112,27 @@ def create_app():
         return render_template("add.html", customers=customers, today=today, active="add")
 
     @app.route("/log")
+    @_conditional
     def view_log():
         import calendar
         month = request.args.get("month") or None
         date_from = request.args.get("date_from") or None
         date_to = request.args.get("date_to") or None
         customer = request.args.get("customer") or None
+        q = (request.args.get("q") or "").strip()
+        per_page = request.args.get("per_page", type=int)
+        if per_page not in PAGE_SIZES:
+            per_page = DEFAULT_PAGE_SIZE
+        after = parse_cursor(request.args.get("after"))
+        before = None if after else parse_cursor(request.args.get("before"))
+
+        # Links keep the filters exactly as the user entered them
+        link_args = {k: v for k, v in (
+            ("month", month), ("date_from", date_from), ("date_to", date_to),
+            ("customer", customer), ("q", q),
+        ) if v}
+        if per_page != DEFAULT_PAGE_SIZE:
+            link_args["per_page"] = per_page
 
         # When a month is selected and no explicit date range, derive it
         if month and not date_from and not date_to:
@@ -67,26 +141,51 @@ def create_app():
             last_day = calendar.monthrange(year, mon)[1]
             date_to = f"{year:04d}-{mon:02d}-{last_day:02d}"
 
-        entries = db.get_entries(date_from=date_from, date_to=date_to, customer=customer)
+        if q:
+            # Search results are ranked, so they page by offset rather than cursor
+            offset = max(request.args.get("offset", 0, type=int), 0)
+            entries = db.search_entries(
+                q, date_from=date_from, date_to=date_to, customer=customer,
+                limit=per_page + 1, offset=offset,
+            )
+            totals = db.search_total(q, date_from=date_from, date_to=date_to, customer=customer)
+            prev_url = next_url = None
+            if offset:
+                prev_url = url_for("view_log", offset=max(offset - per_page, 0) or None, **link_args)
+            if len(entries) > per_page:
+                next_url = url_for("view_log", offset=offset + per_page, **link_args)
+            entries = entries[:per_page]
+        else:
+            entries, prev_url, next_url = _log_page(
+                date_from, date_to, customer, per_page, after, before, link_args,
+            )
+            totals = db.get_entries_total(date_from=date_from, date_to=date_to, customer=customer)
+
         customers = db.get_customers()
-        total = sum(e["hours"] for e in entries)
         months = db.get_months()
         summary = db.get_monthly_summary(month) if month else []
         return render_template(
             "log.html",
             entries=entries,
             customers=customers,
-            total=total,
+            total=totals["hours"],
+            entry_count=totals["count"],
             date_from=date_from or "",
             date_to=date_to or "",
             selected_customer=customer or "",
+            q=q,
             active="log",
             months=months,
             selected_month=month or "",
             summary=summary,
+            per_page=per_page,
+            page_sizes=PAGE_SIZES,
+            prev_url=prev_url,
+            next_url=next_url,
         )
 
     @app.route("/export", methods=["GET", "POST"])
+    @_conditional
     def export():
         customers = db.get_customers()
         if request.method == "POST":
@@ -97,40 +196,45 @@ def create_app():
             if not filename.endswith(".csv"):
                 filename += ".csv"
 
-            entries = db.get_entries(date_from=date_from, date_to=date_to, customer=customer)
-            csv_data = generate_csv(entries)
-            response = make_response(csv_data)
-            response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-            response.headers["Content-Type"] = "text/csv"
-            return response
+            entries = db.iter_entries(date_from=date_from, date_to=date_to, customer=customer)
+            return Response(
+                iter_csv(entries),
+                mimetype="text/csv",
+                headers={"Content-Disposition": f"attachment; filename={filename}"},
+            )
 
         return render_template("export.html", customers=customers, active="export")
 
     @app.route("/import", methods=["POST"])
     def import_csv():
+        import io
         f = request.files.get("csv_file")
         if not f or not f.filename:
             flash("Please select a CSV file.", "error")
             return redirect(url_for("export"))
+        # Parse straight from the upload stream; utf-8-sig strips BOM if present.
+        # import_entries reads it in batches on this thread, outside the writer.
+        text = io.TextIOWrapper(f.stream, encoding="utf-8-sig", newline="")
+        errors = []
         try:
-            text = f.read().decode("utf-8-sig")  # utf-8-sig strips BOM if present
+            imported, skipped = db.import_entries(iter_csv_rows(text, errors))
         except UnicodeDecodeError:
             flash("File must be UTF-8 encoded.", "error")
             return redirect(url_for("export"))
-        rows, errors = parse_csv(text)
-        for e in errors:
+        for e in errors[:MAX_IMPORT_ERRORS]:
             flash(e, "error")
-        if rows:
-            imported, skipped = db.import_entries(rows)
-            if imported:
-                flash(f"Imported {imported} entr{'y' if imported == 1 else 'ies'}.", "success")
-            if skipped:
-                flash(f"Skipped {skipped} duplicate entr{'y' if skipped == 1 else 'ies'}.", "success")
-        elif not errors:
+        if len(errors) > MAX_IMPORT_ERRORS:
+            flash(f"…and {len(errors) - MAX_IMPORT_ERRORS} more rows with errors.", "error")
+        if imported:
+            flash(f"Imported {imported} entr{'y' if imported == 1 else 'ies'}.", "success")
+        if skipped:
+            flash(f"Skipped {skipped} duplicate entr{'y' if skipped == 1 else 'ies'}.", "success")
+        if not imported and not skipped and not errors:
             flash("The CSV file was empty.", "error")
         return redirect(url_for("export"))
 
     @app.route("/customers", methods=["GET", "POST"])
+    @_conditional
     def manage_customers():
         if request.method == "POST":
             name = request.form.get("name", "").strip()
@@ -147,7 +251,10 @@ def create_app():
     def chat():
         customers = db.get_managed_customers()
         today = date.today().isoformat()
-        return render_template("chat.html", customers=customers, today=today, active="chat")
+        return render_template(
+            "chat.html", customers=customers, today=today, active="chat",
+            cache_stats=db.cache_stats(),
+        )
 
     @app.route("/chat/extract", methods=["POST"])
     def chat_extract():
@@ -157,39 +264,89 @@ def create_app():
             return jsonify({"error": "No message provided."}), 400
         customers = db.get_managed_customers()
         try:
-            result = extract_entry(message, customers)
+            result = extract_entry(message, customers, use_cache=not data.get("no_cache"))
         except OllamaError as exc:
             return jsonify({"error": str(exc)}), 502
         return jsonify(result)
 
-    @app.route("/chat/save", methods=["POST"])
-    def chat_save():
+    @app.route("/chat/extract/stream", methods=["POST"])
+    def chat_extract_stream():
+        """Server-sent events version of /chat/extract."""
+        import json
         data = request.get_json(silent=True) or {}
-        date_str = (data.get("date") or "").strip()
-        customer = (data.get("customer") or "").strip()
-        description = (data.get("description") or "").strip()
-        hours_raw = data.get("hours", "")
+        message = (data.get("message") or "").strip()
+        if not message:
+            return jsonify({"error": "No message provided."}), 400
+        customers = db.get_managed_customers()
 
-        errors = []
-        if not date_str:
-            errors.append("Date is required.")
-        if not customer:
-            errors.append("Customer is required.")
-        if not description:
-            errors.append("Description is required.")
-        try:
-            hours = float(hours_raw)
-            if hours <= 0:
-                errors.append("Hours must be positive.")
-        except (ValueError, TypeError):
-            errors.append("Hours must be a number.")
+        def events():
+            try:
+                use_cache = not data.get("no_cache")
+                for event, payload in stream_extract(message, customers, use_cache=use_cache):
+                    yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            except OllamaError as exc:
+                yield f"event: error\ndata: {json.dumps({'error': str(exc)})}\n\n"
 
+        return Response(
+            events(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.route("/chat/status")
+    def chat_status():
+        return jsonify(ollama_status())
+
+    @app.route("/chat/cache/clear", methods=["POST"])
+    def chat_cache_clear():
+        removed = db.cache_clear()
+        return jsonify({"removed": removed, "stats": db.cache_stats()})
+
+    @app.route("/chat/save", methods=["POST"])
+    def chat_save():
+        data = request.get_json(silent=True) or {}
+        entry, errors = validate_entry(data)
         if errors:
             return jsonify({"error": " ".join(errors)}), 422
 
-        db.add_entry(date_str, customer, hours, description)
+        db.add_entry(entry["date"], entry["customer"], entry["hours"], entry["description"])
         return jsonify({"success": True})
 
+    @app.route("/chat/batch")
+    def chat_batch():
+        customers = db.get_managed_customers()
+        return render_template("chat_batch.html", customers=customers, active="chat")
+
+    @app.route("/chat/extract/batch", methods=["POST"])
+    def chat_extract_batch():
+        data = request.get_json(silent=True) or {}
+        items = split_entries(data.get("text") or "")
+        if not items:
+            return jsonify({"error": "No entries found in the text."}), 400
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({"error": f"At most {MAX_BATCH_ITEMS} entries per batch."}), 400
+        customers = db.get_managed_customers()
+        results = extract_batch(items, customers, use_cache=not data.get("no_cache"))
+        return jsonify({"items": results})
+
+    @app.route("/chat/save/batch", methods=["POST"])
+    def chat_save_batch():
+        data = request.get_json(silent=True) or {}
+        entries = []
+        problems = []
+        for index, item in enumerate(data.get("entries") or []):
+            entry, errors = validate_entry(item)
+            if errors:
+                problems.append({"index": index, "error": " ".join(errors)})
+            else:
+                entries.append(entry)
+        if problems:
+            return jsonify({"error": "Some entries are invalid.", "items": problems}), 422
+        if not entries:
+            return jsonify({"error": "No entries to save."}), 400
+        saved = len(db.add_entries(entries))
+        return jsonify({"success": True, "saved": saved})
+
     @app.route("/customers/<path:name>/delete", methods=["POST"])
     def delete_customer(name):
         db.remove_customer(name)
@@ -203,29 +360,14 @@ def create_app():
             flash("Entry not found.", "error")
             return redirect(url_for("view_log"))
         if request.method == "POST":
-            date_str = request.form.get("date", "").strip()
-            customer = request.form.get("customer", "").strip()
-            hours = request.form.get("hours", "")
-            description = request.form.get("description", "").strip()
-            errors = []
-            if not date_str:
-                errors.append("Date is required.")
-            if not customer:
-                errors.append("Customer is required.")
-            if not description:
-                errors.append("Description is required.")
-            try:
-                hours = float(hours)
-                if hours <= 0:
-                    errors.append("Hours must be positive.")
-            except (ValueError, TypeError):
-                errors.append("Hours must be a number.")
+            fields, errors = validate_entry(request.form)
             if errors:
                 for e in errors:
                     flash(e, "error")
                 customers = db.get_managed_customers()
                 return render_template("edit.html", entry=entry, customers=customers, active="log")
-            db.update_entry(entry_id, date_str, customer, hours, description)
+            db.update_entry(entry_id, fields["date"], fields["customer"], fields["hours"],
+                            fields["description"])
             flash("Entry updated.", "success")
             referrer = request.form.get("referrer", "")
             return redirect(referrer if referrer else url_for("view_log"))
@@ -243,3 +385,49 @@ def create_app():
         return redirect(url_for("view_log"))
 
     return app
+
+
+def serve(app, port, threads=8, idle_timeout=120, shutdown_timeout=10, host="127.0.0.1"):
+    """Run ``app`` on the Waitress production server until interrupted.
+
+    Connections (including idle keep-alive ones) with no traffic for
+    ``idle_timeout`` seconds are closed; requests themselves have no time
+    limit. Ctrl+C or SIGTERM stops accepting connections and gives in-flight
+    requests up to ``shutdown_timeout`` seconds to finish.
+    """
+    import logging, signal
+    from waitress.server import create_server
+
+    access_log = logging.getLogger("minelogger.access")
+
+    @app.after_request
+    def log_request(response):
+        access_log.info('%s "%s %s" %s', request.remote_addr, request.method,
+                        request.full_path.rstrip("?"), response.status_code)
+        return response
+
+    server = create_server(
+        app,
+        host=host,
+        port=port,
+        threads=threads,
+        channel_timeout=idle_timeout,
+        # Idle connections are only looked for this often (Waitress default 30)
+        cleanup_interval=min(30, idle_timeout),
+        ident="mineLogger",
+    )
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    for name in ("SIGTERM", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), stop)
+
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        server.task_dispatcher.shutdown(cancel_pending=False, timeout=shutdown_timeout)
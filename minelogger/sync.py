@@ -0,0 +1,98 @@
+"""Delta files for syncing entries between installations.
+
+A delta is JSON lines: a header naming the range of change sequence
+numbers it covers, then one line per change from ``db.iter_changes``.
+Only the latest change per entry is written, so a daily sync carries each
+edited entry once and each deleted one as a short tombstone. Customer
+renames are lines of their own (version 2). Files ending in .gz are
+compressed.
+"""
+import gzip
+import json
+
+from . import db
+
+FORMAT = "minelogger-delta"
+VERSION = 2
+
+_FIELDS = ("op", "uid", "updated_at", "date", "customer", "hours", "description", "created_at",
+           "name")
+_REQUIRED = {
+    "upsert": ("uid", "updated_at", "date", "customer", "hours", "description"),
+    "delete": ("uid", "updated_at"),
+    "rename": ("updated_at", "customer", "name"),
+}
+
+
+class DeltaError(ValueError):
+    """The file is not a delta this version can apply."""
+
+
+def _open(path, mode):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_delta(f, since=0):
+    """Write changes after ``since`` to the text file ``f``. Returns (count, until).
+
+    ``until`` is the sequence number to pass as ``since`` next time.
+    """
+    until = db.get_change_seq()
+    header = {"format": FORMAT, "version": VERSION, "since": since, "until": until}
+    f.write(json.dumps(header) + "\n")
+    count = 0
+    for change in db.iter_changes(since):
+        if change["seq"] > until:
+            continue  # written after we started; the next delta picks it up
+        record = {k: change[k] for k in _FIELDS if k in change}
+        f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        count += 1
+    return count, until
+
+
+def export_delta(path, since=0):
+    """Write a delta file to ``path``. Returns (count, until)."""
+    with _open(path, "w") as f:
+        return write_delta(f, since)
+
+
+def read_delta(lines):
+    """Parse delta lines. Returns (header, iterator of changes).
+
+    Raises DeltaError if the header is missing or from a newer version.
+    """
+    lines = iter(lines)
+    try:
+        header = json.loads(next(lines))
+    except (StopIteration, ValueError):
+        raise DeltaError("Not a mineLogger delta file.") from None
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise DeltaError("Not a mineLogger delta file.")
+    if header.get("version", 0) > VERSION:
+        raise DeltaError(f"Delta version {header['version']} is newer than this mineLogger supports.")
+
+    def changes():
+        for number, line in enumerate(lines, start=2):
+            if not line.strip():
+                continue
+            try:
+                change = json.loads(line)
+                required = _REQUIRED[change["op"]]
+                if not all(change.get(k) for k in required):
+                    raise ValueError
+                if "hours" in required:
+                    float(change["hours"])
+            except (ValueError, KeyError, TypeError):
+                raise DeltaError(f"Line {number}: invalid change.") from None
+            yield change
+
+    return header, changes()
+
+
+def apply_delta(path):
+    """Apply the delta file at ``path``. Returns (header, counts from db.apply_changes)."""
+    with _open(path, "r") as f:
+        header, changes = read_delta(f)
+        return header, db.apply_changes(changes)
@@ -0,0 +1,67 @@
+"""Entry validation shared by the web forms, the chat endpoints and the JSON API."""
+import re
+from datetime import date
+
+ENTRY_FIELDS = ("date", "customer", "hours", "description")
+
+# date.fromisoformat also takes "20261001" and "2026-W40-1" on Python 3.11+,
+# but stored dates must be YYYY-MM-DD (months are split out of them)
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ""
+
+
+def validate_entry(data, default_date=None):
+    """Validate entry fields from a form or JSON object. Returns (entry, errors).
+
+    ``data`` is any mapping with date, customer, hours and description; hours
+    may be a number or a string. A blank date falls back to ``default_date``.
+    """
+    date_str = _text(data.get("date")) or default_date or ""
+    customer = _text(data.get("customer"))
+    description = _text(data.get("description"))
+    hours_raw = data.get("hours", "")
+
+    errors = []
+    if not date_str:
+        errors.append("Date is required.")
+    else:
+        try:
+            if not _DATE_RE.fullmatch(date_str):
+                raise ValueError
+            date.fromisoformat(date_str)
+        except ValueError:
+            errors.append("Date must be in YYYY-MM-DD format.")
+    if not customer:
+        errors.append("Customer is required.")
+    if not description:
+        errors.append("Description is required.")
+    hours = None
+    try:
+        if isinstance(hours_raw, bool):
+            raise TypeError
+        hours = float(hours_raw)
+        if hours <= 0:
+            errors.append("Hours must be positive.")
+    except (ValueError, TypeError):
+        errors.append("Hours must be a number.")
+
+    entry = {"date": date_str, "customer": customer, "hours": hours, "description": description}
+    return entry, errors
+
+
+def format_cursor(entry):
+    """Return the "date_id" keyset cursor for an entry."""
+    return f"{entry['date']}_{entry['id']}"
+
+
+def parse_cursor(value):
+    """Parse a "date_id" cursor into (date, id); None if missing or malformed."""
+    if not value:
+        return None
+    date_part, _, id_part = value.rpartition("_")
+    if not date_part or not id_part.isdigit():
+        return None
+    return date_part, int(id_part)
@@ -0,0 +1,165 @@
+"""A single writer thread that applies database writes in small batches.
+
+When started (``db.start_writer()``), every db function marked ``@_write``
+is handed to this thread instead of running on the caller's connection. The
+thread owns the only writing connection, so concurrent requests never race
+for SQLite's write lock. Operations that queue up while a batch commits are
+applied together in the next transaction, each inside its own SAVEPOINT so
+a failing operation is undone without affecting the others. Callers block
+until their batch has committed and then get the return value or exception.
+If the thread stops, whether by ``stop()`` or a crash, anything still queued
+fails with WriterStopped instead of waiting forever.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+
+from . import db
+
+MAX_BATCH = 64
+
+_STOP = object()
+
+
+class WriterStopped(RuntimeError):
+    """The writer thread is not running, so the write was not applied."""
+
+
+class _Savepoint:
+    """Stands in for the writer's connection while a batch is applied.
+
+    ``with conn:`` in the db functions opens a savepoint instead of a
+    transaction, and ``rollback()`` only undoes the current operation.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.execute("SAVEPOINT op")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._conn.execute("ROLLBACK TO op")
+        self._conn.execute("RELEASE op")
+        return False
+
+    def rollback(self):
+        self._conn.execute("ROLLBACK TO op")
+
+
+class Writer:
+    """Owns the write connection and applies queued operations in batches."""
+
+    def __init__(self, max_batch=MAX_BATCH):
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()  # orders submit() against the thread's exit
+        self.batches = 0
+        self.operations = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Apply everything already queued, then stop the thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def in_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn, args=(), kwargs=None):
+        """Run ``fn(*args, **kwargs)`` on the writer thread and return its result.
+
+        Raises WriterStopped if the thread has exited or exits before
+        getting to this call.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed or self._thread is None or not self._thread.is_alive():
+                raise WriterStopped("The database writer is not running.")
+            self._queue.put((future, fn, args, kwargs or {}))
+        return future.result()
+
+    def _run(self):
+        batch = []
+        try:
+            conn = db._connect()
+            while True:
+                item = self._queue.get()
+                batch = []
+                stopping = item is _STOP
+                if not stopping:
+                    batch.append(item)
+                # Take whatever else is already waiting; no artificial delay.
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                if batch:
+                    self._apply(conn, batch)
+                if stopping:
+                    return
+        finally:
+            self._fail_pending(batch)
+            db.close_connection()
+
+    def _fail_pending(self, batch):
+        """Refuse new work and fail everything not yet answered."""
+        with self._lock:
+            self._closed = True
+        pending = [item[0] for item in batch]
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                pending.append(item[0])
+        for future in pending:
+            if not future.done():
+                future.set_exception(WriterStopped("The database writer stopped."))
+
+    def _apply(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            db._local.batch_conn = _Savepoint(conn)
+            try:
+                for future, fn, args, kwargs in batch:
+                    try:
+                        outcomes.append((future, fn(*args, **kwargs), None))
+                    except BaseException as exc:
+                        outcomes.append((future, None, exc))
+            finally:
+                db._local.batch_conn = None
+            conn.commit()
+        except BaseException as exc:
+            # The transaction failed as a whole: nothing in this batch was saved.
+            if conn.in_transaction:
+                conn.rollback()
+            for future, *_ in batch:
+                future.set_exception(exc)
+            return
+        self.batches += 1
+        self.operations += len(outcomes)
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
@@ -0,0 +1,23 @@
+import pytest
+
+from minelogger import db
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """An empty database in a temporary directory, used by every db call."""
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "minelogger.db")
+    db.close_connection()
+    db.clear_lookup_cache()
+    db.init_db()
+    yield db.DB_PATH
+    db.close_connection()
+    db.clear_lookup_cache()
+
+
+@pytest.fixture
+def client(temp_db):
+    from minelogger.server import create_app
+    app = create_app()
+    app.config["TESTING"] = True
+    return app.test_client()
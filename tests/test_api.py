@@ -0,0 +1,43 @@
+import pytest
+
+
+def _post(client, **fields):
+    entry = {"date": "2026-10-01", "customer": "Acme", "hours": 2, "description": "Review"}
+    entry.update(fields)
+    return client.post("/api/v1/entries", json={"entries": [entry]})
+
+
+def test_create_entry(client):
+    response = _post(client)
+    assert response.status_code == 201
+    entry_id = response.get_json()["results"][0]["id"]
+    assert client.get(f"/api/v1/entries/{entry_id}").get_json()["date"] == "2026-10-01"
+
+
+@pytest.mark.parametrize("value", ["20261001", "2026-W40-1", "2026-10-1"])
+def test_rejects_non_calendar_dates(client, value):
+    response = _post(client, date=value)
+    assert response.status_code == 422
+    assert response.get_json()["results"][0]["errors"] == ["Date must be in YYYY-MM-DD format."]
+    assert client.get("/api/v1/entries").get_json()["entries"] == []
+    assert client.get("/log").status_code == 200
+
+
+def test_update_rejects_compact_date(client):
+    entry_id = _post(client).get_json()["results"][0]["id"]
+    response = client.patch("/api/v1/entries", json={"entries": [{"id": entry_id, "date": "20261002"}]})
+    assert response.status_code == 422
+    assert client.get(f"/api/v1/entries/{entry_id}").get_json()["date"] == "2026-10-01"
+    assert client.get("/log").status_code == 200
+
+
+def test_batch_save_and_api_create_share_one_path(client):
+    entries = [{"date": "2026-10-01", "customer": "Acme", "hours": 1, "description": f"Task {i}"}
+               for i in range(3)]
+    response = client.post("/chat/save/batch", json={"entries": entries})
+    assert response.get_json() == {"success": True, "saved": 3}
+    response = client.post("/api/v1/entries", json={"entries": entries[:2]})
+    ids = [r["id"] for r in response.get_json()["results"]]
+    assert ids == [4, 5]
+    assert [client.get(f"/api/v1/entries/{i}").get_json()["description"] for i in ids] == [
+        "Task 0", "Task 1"]
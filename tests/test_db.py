@@ -0,0 +1,90 @@
+import pytest
+
+from minelogger import db
+
+
+def _entry(**fields):
+    entry = {"date": "2026-10-01", "customer": "Acme", "hours": 2.0, "description": "Review"}
+    entry.update(fields)
+    return entry
+
+
+def test_import_skips_existing_entries(temp_db):
+    assert db.import_entries([_entry(), _entry(), _entry(hours=1)]) == (2, 1)
+    assert db.import_entries([_entry(), _entry(hours=3)]) == (1, 1)
+
+
+def test_rename_changes_only_the_customer(temp_db):
+    db.import_entries([_entry(), _entry(description="Standup")])
+    before = {e["id"]: (e["content_hash"], e["updated_at"]) for e in db.get_entries()}
+    seq = db.get_change_seq()
+
+    assert db.rename_customer("Acme", "Acme Corp") == 2
+    # One change for the rename itself, none for the entries
+    assert [(c["op"], c["customer"], c["name"]) for c in db.iter_changes(seq)] == [
+        ("rename", "Acme", "Acme Corp")]
+    entries = db.get_entries()
+    assert {e["customer"] for e in entries} == {"Acme Corp"}
+    assert {e["id"]: (e["content_hash"], e["updated_at"]) for e in entries} == before
+    # Duplicate detection still recognises the renamed entries
+    assert db.import_entries([_entry(customer="Acme Corp")]) == (0, 1)
+
+
+def test_merge_moves_entries(temp_db):
+    db.import_entries([_entry(), _entry(customer="ACME Inc", description="Standup")])
+    assert db.merge_customers("ACME Inc", "Acme") == 1
+    assert db.get_customers() == ["Acme"]
+    assert db.import_entries([_entry(description="Standup")]) == (0, 1)
+
+
+def test_failed_import_saves_nothing(temp_db):
+    def rows():
+        yield _entry()
+        yield _entry(description="Standup")
+        raise ValueError("bad upload")
+
+    with pytest.raises(ValueError):
+        db.import_entries(rows(), batch_size=1)
+    assert db.get_entries() == []
+    assert db.import_entries([_entry()]) == (1, 0)
+
+
+@pytest.fixture
+def searchable(temp_db):
+    db.import_entries([
+        _entry(description="Database migration planning"),
+        _entry(date="2026-10-05", description="Migrated invoices"),
+        _entry(date="2026-10-06", customer="Beta", description="Migration review"),
+        _entry(date="2026-10-07", description="Weekly standup"),
+    ])
+
+
+def _descriptions(entries):
+    return sorted(e["description"] for e in entries)
+
+
+def test_search_matches_word_prefixes(searchable):
+    assert _descriptions(db.search_entries("migr")) == [
+        "Database migration planning", "Migrated invoices", "Migration review"]
+    # Every word must match, in the description or the customer name
+    assert _descriptions(db.search_entries("migr plan")) == ["Database migration planning"]
+    assert _descriptions(db.search_entries("beta migr")) == ["Migration review"]
+    assert db.search_entries("migr standup") == []
+    assert db.search_entries("  ") == []
+
+
+def test_search_highlights_matches(searchable):
+    if not db._has_search_index(db._connect()):
+        pytest.skip("SQLite was built without FTS5")
+    [entry] = db.search_entries("plan")
+    assert entry["highlighted"] == (
+        f"Database migration {db.HIGHLIGHT_START}planning{db.HIGHLIGHT_END}")
+
+
+def test_search_combines_with_filters(searchable):
+    assert _descriptions(db.search_entries("migr", customer="Acme")) == [
+        "Database migration planning", "Migrated invoices"]
+    assert _descriptions(db.search_entries("migr", date_from="2026-10-05",
+                                           date_to="2026-10-05")) == ["Migrated invoices"]
+    assert db.search_total("migr", customer="Acme") == {"count": 2, "hours": 4.0}
+    assert db.search_total("migr", date_from="2026-10-08") == {"count": 0, "hours": 0}
@@ -0,0 +1,19 @@
+from minelogger import db
+from minelogger.export import generate_csv, parse_csv
+
+ENTRY = {"date": "2026-10-01", "customer": "Acme", "hours": 2.0, "description": "Review, part 1"}
+
+
+def test_entry_tuples_and_dicts_give_the_same_csv(temp_db):
+    db.import_entries([ENTRY, dict(ENTRY, hours=1.5)])
+    from_tuples = generate_csv(db.iter_entries())
+    assert generate_csv(db.get_entries()) == from_tuples
+
+    rows, errors = parse_csv(from_tuples)
+    assert errors == []
+    assert sorted(r["hours"] for r in rows) == [1.5, 2.0]
+    assert {r["description"] for r in rows} == {"Review, part 1"}
+
+
+def test_empty_export_has_a_header():
+    assert generate_csv([]) == "date,customer,hours,description,created_at\r\n"
@@ -0,0 +1,83 @@
+import pytest
+
+from minelogger import db
+
+# (date, customer, hours, description) as stored by schema 6
+V6_ENTRIES = [
+    ("2026-09-30", "Acme", 1.5, "SSO migration planning"),
+    ("2026-10-01", "Acme", 2.0, "SSO migration review"),
+    ("2026-10-01", "Beta", 3.0, "Invoice export"),
+    ("2026-10-02", "Beta", 1.0, "Deleted later"),
+    ("2026-10-03", "Gamma", 4.0, "Deleted later"),
+]
+
+
+@pytest.fixture
+def v6_db(tmp_path, monkeypatch):
+    """A schema-6 database with entries and deleted ids. Yields the id high-water mark."""
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "minelogger.db")
+    db.close_connection()
+    db.clear_lookup_cache()
+    yield _build_v6(monkeypatch)
+    db.close_connection()
+    db.clear_lookup_cache()
+
+
+def _build_v6(monkeypatch):
+    migrations = db._MIGRATIONS
+    monkeypatch.setattr(db, "_MIGRATIONS", migrations[:6])
+    monkeypatch.setattr(db, "SCHEMA_VERSION", 6)
+    db.init_db()
+    conn = db._connect()
+    assert db.get_schema_version() == 6
+    with conn:
+        conn.execute("INSERT INTO customers (name, created_at) VALUES ('Acme', '2026-01-01T00:00:00')")
+        for date_str, customer, hours, description in V6_ENTRIES:
+            conn.execute(
+                """INSERT INTO entries (date, customer, hours, description, created_at,
+                                        content_hash, uid, updated_at)
+                   VALUES (?, ?, ?, ?, '2026-10-01T00:00:00', entry_hash(?, ?, ?, ?),
+                           lower(hex(randomblob(16))), '2026-10-01T00:00:00.000Z')""",
+                (date_str, customer, hours, description, date_str, customer, hours, description),
+            )
+        conn.execute("DELETE FROM entries WHERE description = 'Deleted later'")
+    high_water = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'entries'").fetchone()[0]
+    monkeypatch.setattr(db, "_MIGRATIONS", migrations)
+    monkeypatch.setattr(db, "SCHEMA_VERSION", len(migrations))
+    return high_water
+
+
+def test_upgrade_from_schema_6(v6_db):
+    high_water = v6_db
+    db.init_db()
+    assert db.get_schema_version() == db.SCHEMA_VERSION
+
+    entries = db.get_entries()
+    assert sorted((e["date"], e["customer"], e["hours"], e["description"]) for e in entries) == \
+        sorted(V6_ENTRIES[:3])
+    assert db.get_monthly_summary("2026-10") == [
+        {"customer": "Acme", "hours": 2.0}, {"customer": "Beta", "hours": 3.0}]
+    assert db.get_monthly_summary("2026-09") == [{"customer": "Acme", "hours": 1.5}]
+    assert [m["value"] for m in db.get_months()] == ["2026-10", "2026-09"]
+
+    found = db.search_entries("migr review")
+    assert [e["description"] for e in found] == ["SSO migration review"]
+    assert db.HIGHLIGHT_START in found[0]["highlighted"]
+    assert len(db.search_entries("beta")) == 1
+
+    # Previously managed customers stay managed; names only seen on entries do not
+    assert db.get_managed_customers() == ["Acme"]
+    assert db.get_customers() == ["Acme", "Beta"]
+
+    # Deleted ids are not handed out again
+    db.add_entry("2026-10-05", "Beta", 1, "After the upgrade")
+    assert max(e["id"] for e in db.get_entries()) == high_water + 1
+
+    # Content hashes were recomputed for the id-based scheme
+    assert db.import_entries([dict(zip(("date", "customer", "hours", "description"), row))
+                              for row in V6_ENTRIES[:3]]) == (0, 3)
+    conn = db._connect()
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    if db._has_search_index(conn):
+        conn.execute("INSERT INTO entries_fts (entries_fts) VALUES ('integrity-check')")
@@ -0,0 +1,185 @@
+import socket
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from minelogger import ollama
+
+
+def _set_today(monkeypatch, day):
+    class FakeDate(date):
+        @classmethod
+        def today(cls):
+            return day
+    monkeypatch.setattr(ollama, "date", FakeDate)
+
+
+def _extracted(day):
+    return {"date": day, "customer": "Acme", "hours": 3.0, "description": "Review"}
+
+
+@pytest.mark.parametrize("message", [
+    "3h Acme review on the 3rd",
+    "3h Acme review on the 21st",
+    "3h Acme review friday",
+    "3h Acme review 10/3",
+    "3h Acme review 2026-10-03",
+    "1.5h Acme review 3.10.",
+])
+def test_cached_calendar_dates_expire_with_the_day(temp_db, monkeypatch, message):
+    _set_today(monkeypatch, date(2026, 10, 14))
+    ollama._cache_store(message, ["Acme"], _extracted("2026-10-03"))
+    assert ollama._cache_lookup(message, ["Acme"])["date"] == "2026-10-03"
+
+    _set_today(monkeypatch, date(2026, 11, 14))
+    assert ollama._cache_lookup(message, ["Acme"]) is None
+
+
+def test_cached_relative_dates_follow_today(temp_db, monkeypatch):
+    message = "3h Acme review yesterday"
+    _set_today(monkeypatch, date(2026, 10, 14))
+    ollama._cache_store(message, ["Acme"], _extracted("2026-10-13"))
+
+    _set_today(monkeypatch, date(2026, 11, 14))
+    assert ollama._cache_lookup(message, ["Acme"])["date"] == "2026-11-13"
+
+
+@pytest.mark.parametrize("message", [
+    "1.5h Acme review yesterday",
+    "2.25 hours Acme review yesterday",
+    "1.5hrs Acme review yesterday",
+])
+def test_decimal_hours_are_not_dates(temp_db, monkeypatch, message):
+    _set_today(monkeypatch, date(2026, 10, 14))
+    ollama._cache_store(message, ["Acme"], _extracted("2026-10-13"))
+
+    _set_today(monkeypatch, date(2026, 11, 14))
+    assert ollama._cache_lookup(message, ["Acme"])["date"] == "2026-11-13"
+
+
+def test_partial_fields_skip_text_that_does_not_decode_yet():
+    text = '{"customer": "Acme", "description": "Caf\\u00", "hours": 2,'
+    assert ollama._partial_fields(text) == {"customer": "Acme", "hours": 2.0}
+    text = '{"customer": "Acme", "description": "Caf\\u00e9", "hours": 2,'
+    assert ollama._partial_fields(text)["description"] == "Café"
+
+
+@pytest.fixture
+def down_client(monkeypatch):
+    """The module client, pointed at a port where nothing listens."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    down = ollama.OllamaClient(base_url=f"http://127.0.0.1:{port}")
+    monkeypatch.setattr(ollama, "client", down)
+    return down
+
+
+def test_status_checks_do_not_trip_the_breaker(down_client):
+    for _ in range(ollama.FAILURE_THRESHOLD + 1):
+        assert ollama.status()["reachable"] is False
+    assert down_client.circuit_state() == "closed"
+
+
+def test_status_does_not_poll_while_the_circuit_is_open(down_client, monkeypatch):
+    down_client._open_until = time.monotonic() + 30
+
+    def no_request(*args, **kwargs):
+        raise AssertionError("polled Ollama with the circuit open")
+
+    monkeypatch.setattr(down_client.session, "request", no_request)
+    assert ollama.status()["circuit"] == "open"
+    assert ollama.status()["reachable"] is False
+
+
+class _Ok:
+    def raise_for_status(self):
+        pass
+
+
+def test_breaker_opens_then_half_opens_and_closes(down_client, monkeypatch):
+    down_client._probing = True  # no background probe; see the next test
+    for _ in range(ollama.FAILURE_THRESHOLD):
+        assert down_client.circuit_state() == "closed"
+        with pytest.raises(ollama.OllamaError, match="Cannot reach"):
+            down_client.request("GET", "/api/tags")
+    assert down_client.circuit_state() == "open"
+
+    calls = []
+
+    def answer(*args, **kwargs):
+        calls.append(args)
+        return _Ok()
+
+    monkeypatch.setattr(down_client.session, "request", answer)
+    with pytest.raises(ollama.OllamaError, match="not retrying"):
+        down_client.request("GET", "/api/tags")
+    assert calls == []
+
+    # After the cooldown one request is let through and its success closes the circuit
+    down_client._open_until = time.monotonic() - 1
+    assert down_client.circuit_state() == "half-open"
+    down_client.request("GET", "/api/tags")
+    assert len(calls) == 1
+    assert down_client.circuit_state() == "closed"
+
+
+def test_half_open_failure_reopens_at_once(down_client):
+    down_client._probing = True
+    down_client._failures = ollama.FAILURE_THRESHOLD
+    with pytest.raises(ollama.OllamaError, match="Cannot reach"):
+        down_client.request("GET", "/api/tags")
+    assert down_client.circuit_state() == "open"
+
+
+def test_probe_closes_the_circuit(down_client, monkeypatch):
+    monkeypatch.setattr(ollama, "PROBE_INTERVAL", 0.01)
+    for _ in range(ollama.FAILURE_THRESHOLD):
+        with pytest.raises(ollama.OllamaError):
+            down_client.request("GET", "/api/tags")
+    assert down_client.circuit_state() == "open"
+    monkeypatch.setattr(down_client.session, "get", lambda *a, **k: _Ok())
+    deadline = time.monotonic() + 5
+    while down_client.circuit_state() != "closed" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert down_client.circuit_state() == "closed"
+
+
+def test_coalesce_shares_one_call(down_client):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"ok": len(calls)}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(down_client.coalesce("k", slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(down_client.coalesce("k", slow)))
+                 for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.1)  # let the followers find the call in flight
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert calls == [1]
+    assert results == [{"ok": 1}] * 4
+
+    # Once finished, the same key runs again
+    assert down_client.coalesce("k", lambda: "again") == "again"
+
+
+def test_coalesce_shares_errors(down_client):
+    def fail():
+        raise ollama.OllamaError("boom")
+
+    with pytest.raises(ollama.OllamaError, match="boom"):
+        down_client.coalesce("k", fail)
+    assert down_client._inflight == {}
@@ -0,0 +1,95 @@
+import html
+import re
+
+import pytest
+
+from minelogger import db
+from minelogger.validation import format_cursor
+
+# Several entries share a date, so the id decides their order
+DATES = ["2026-10-01", "2026-10-01", "2026-10-02", "2026-10-02", "2026-10-02",
+         "2026-10-03", "2026-10-04"]
+
+
+@pytest.fixture
+def entries(temp_db):
+    db.add_entries([{"date": d, "customer": "Acme", "hours": 1, "description": f"Task {i}"}
+                    for i, d in enumerate(DATES)])
+    return [(e["date"], e["id"]) for e in db.get_entries()]
+
+
+def _keys(rows):
+    return [(e["date"], e["id"]) for e in rows]
+
+
+def test_log_order_is_newest_first_with_id_ties(entries):
+    assert entries == sorted(entries, reverse=True)
+
+
+def test_paging_forward_then_back_visits_every_entry_once(entries):
+    pages = []
+    after = None
+    while True:
+        page = db.get_entries(limit=3, after=after)
+        if not page:
+            break
+        pages.append(_keys(page))
+        after = (page[-1]["date"], page[-1]["id"])
+    assert [key for page in pages for key in page] == entries
+    assert [len(page) for page in pages] == [3, 3, 1]
+
+    # Back from the last page with "before" gives the same pages
+    before = pages[-1][0]
+    for expected in reversed(pages[:-1]):
+        page = db.get_entries(limit=3, before=before)
+        assert _keys(page) == expected
+        before = (page[0]["date"], page[0]["id"])
+
+
+def test_cursors_at_the_ends(entries):
+    assert db.get_entries(limit=3, before=entries[0]) == []
+    assert db.get_entries(limit=3, after=entries[-1]) == []
+    # Cursors inside a run of equal dates split it by id
+    assert _keys(db.get_entries(after=entries[2])) == entries[3:]
+    assert _keys(db.get_entries(before=entries[3])) == entries[:3]
+
+
+def test_paging_keeps_filters(entries):
+    db.add_entry("2026-10-02", "Beta", 1, "Other customer")
+    page = db.get_entries(customer="Acme", limit=2, after=entries[1])
+    assert _keys(page) == entries[2:4]
+
+
+def _links(page):
+    text = page.get_data(as_text=True)
+    found = {}
+    for rel, label in (("prev", "Newer"), ("next", "Older")):
+        m = re.search(r'<a href="([^"]+)" class="btn btn-sm">[^<]*' + label, text)
+        found[rel] = html.unescape(m.group(1)) if m else None
+    return found
+
+
+def test_log_page_links(client, temp_db):
+    db.add_entries([{"date": f"2026-09-{1 + i % 28:02d}", "customer": "Acme", "hours": 1,
+                     "description": f"Task {i}"} for i in range(30)])
+    first = _links(client.get("/log?per_page=25"))
+    assert first["prev"] is None and "after=" in first["next"]
+
+    last = _links(client.get(first["next"]))
+    assert last["next"] is None and "before=" in last["prev"]
+
+    back = _links(client.get(last["prev"]))
+    assert back == first
+
+
+def test_api_pages_with_next_cursor(client, entries):
+    seen = []
+    url = "/api/v1/entries?limit=3"
+    while url:
+        body = client.get(url).get_json()
+        seen += [(e["date"], e["id"]) for e in body["entries"]]
+        url = f"/api/v1/entries?limit=3&after={body['next']}" if body["next"] else None
+    assert seen == entries
+    last = {"date": entries[-1][0], "id": entries[-1][1]}
+    assert client.get(f"/api/v1/entries?after={format_cursor(last)}").get_json() == {
+        "entries": [], "next": None}
@@ -0,0 +1,47 @@
+from datetime import date
+
+import pytest
+
+from minelogger import ollama, rules
+
+TODAY = date(2026, 10, 14)
+
+
+@pytest.mark.parametrize("message, hours", [
+    ("Acme: 1h 30 review", 1.5),
+    ("Acme: 1h30 review", 1.5),
+    ("Acme: 1h 30 min review", 1.5),
+    ("2 hours and a half Acme review", 2.5),
+    ("half a day Acme workshop", 4.0),
+])
+def test_hours(message, hours):
+    assert rules.parse(message, ["Acme"], today=TODAY)["hours"] == hours
+
+
+@pytest.mark.parametrize("message", [
+    "Acme: 2h 20 tickets closed",
+    "2h 45 emails for Acme",
+    "Acme 2 hours 10 bugs fixed",
+    "Acme: 1h 30 review",
+])
+def test_numbers_after_hours_go_to_the_model(message):
+    # A separate two-digit number may be minutes or a count of something
+    assert rules.parse(message, ["Acme"], today=TODAY)["confidence"] < rules.CONFIDENCE_THRESHOLD
+    assert ollama._fast_path(message, ["Acme"]) is None
+
+
+def test_attached_minutes_are_trusted():
+    result = ollama._fast_path("Acme: 1h30 review", ["Acme"])
+    assert (result["hours"], result["description"]) == (1.5, "Review")
+
+
+def test_fast_path_needs_a_description():
+    result = rules.parse("2h Acme", ["Acme"], today=TODAY)
+    assert result["description"] is None
+    assert ollama._fast_path("2h Acme", ["Acme"]) is None
+
+
+def test_fast_path_answers_plain_messages():
+    result = ollama._fast_path("2h Acme code review", ["Acme"])
+    assert result["source"] == "rules"
+    assert (result["customer"], result["hours"], result["description"]) == ("Acme", 2.0, "Code review")
@@ -0,0 +1,33 @@
+from minelogger import db
+
+
+def test_unchanged_log_answers_304(client):
+    first = client.get("/log")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert "no-cache" in first.headers["Cache-Control"]
+
+    again = client.get("/log", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    assert again.headers["ETag"] == etag
+
+
+def test_write_changes_the_etag(client):
+    etag = client.get("/log").headers["ETag"]
+    db.add_entry("2026-10-01", "Acme", 2, "Review")
+    response = client.get("/log", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "Review" in response.get_data(as_text=True)
+
+
+def test_pending_flash_bypasses_the_cache(client):
+    etag = client.get("/customers").headers["ETag"]
+    # An empty name only flashes an error; no data changes
+    client.post("/customers", data={"name": " "})
+    response = client.get("/customers", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "Customer name cannot be empty." in response.get_data(as_text=True)
+    # Once the flash is shown the page is cacheable again
+    assert client.get("/customers", headers={"If-None-Match": etag}).status_code == 304
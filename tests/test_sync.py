@@ -0,0 +1,204 @@
+import io
+
+import pytest
+
+from minelogger import db, sync
+
+
+@pytest.fixture
+def sites(tmp_path, monkeypatch):
+    """Two installations, "a" and "b"; ``use(name)`` switches between them."""
+    def use(name):
+        monkeypatch.setattr(db, "DB_PATH", tmp_path / f"{name}.db")
+        db.clear_lookup_cache()
+        db.init_db()
+    yield use
+    db.close_connection()
+    db.clear_lookup_cache()
+
+
+def send(use, source, target, since=0):
+    """Export ``source``'s changes after ``since`` and apply them to ``target``.
+
+    Returns (counts, until).
+    """
+    use(source)
+    delta = io.StringIO()
+    _, until = sync.write_delta(delta, since)
+    use(target)
+    _, changes = sync.read_delta(io.StringIO(delta.getvalue()))
+    return db.apply_changes(changes), until
+
+
+def _entry(**fields):
+    entry = {"date": "2026-10-01", "customer": "Acme", "hours": 2.0, "description": "Review"}
+    entry.update(fields)
+    return entry
+
+
+def _log(use, name):
+    use(name)
+    return sorted((e["customer"], e["hours"], e["description"]) for e in db.get_entries())
+
+
+def test_rename_reaches_the_other_side(sites):
+    sites("a")
+    db.import_entries([_entry(), _entry(description="Standup")])
+    counts, until = send(sites, "a", "b")
+    assert counts["inserted"] == 2
+
+    sites("a")
+    db.rename_customer("Acme", "Acme Corp")
+    entry = db.get_entries()[0]
+    db.update_entry(entry["id"], entry["date"], "Acme Corp", 3, entry["description"])
+    counts, _ = send(sites, "a", "b", since=until)
+    assert (counts["renamed"], counts["updated"], counts["inserted"]) == (1, 1, 0)
+
+    sites("b")
+    assert db.get_customers() == ["Acme Corp"]
+    assert _log(sites, "b") == _log(sites, "a")
+
+
+def test_rename_folds_into_an_existing_customer(sites):
+    sites("a")
+    db.import_entries([_entry(), _entry(description="Standup")])
+    _, until = send(sites, "a", "b")
+    sites("b")
+    db.add_customer("Acme")
+    db.add_entry("2026-10-02", "Acme Corp", 1, "Planning")
+    seq = db.get_change_seq()
+
+    sites("a")
+    db.rename_customer("Acme", "Acme Corp")
+    counts, _ = send(sites, "a", "b", since=until)
+    assert counts["renamed"] == 1
+
+    sites("b")
+    assert db.get_customers() == ["Acme Corp"]
+    assert db.get_managed_customers() == ["Acme Corp"]
+    assert {e["customer"] for e in db.get_entries()} == {"Acme Corp"}
+    # The moved entries came from "a"; they are not sent back
+    assert list(db.iter_changes(seq)) == []
+    assert [c["description"] for c in db.iter_changes()] == ["Planning"]
+
+
+def test_reapplying_a_rename_is_harmless(sites):
+    sites("a")
+    db.import_entries([_entry()])
+    db.rename_customer("Acme", "Acme Corp")
+    send(sites, "a", "b")
+    counts, _ = send(sites, "a", "b")
+    assert counts["renamed"] == 0
+    assert _log(sites, "b") == [("Acme Corp", 2.0, "Review")]
+
+
+def _edit(use, name, description, hours=None):
+    use(name)
+    entry = db.get_entries()[0]
+    db.update_entry(entry["id"], entry["date"], entry["customer"],
+                    hours or entry["hours"], description)
+
+
+def _exchange(use):
+    send(use, "a", "b")
+    send(use, "b", "a")
+
+
+def _shared_entry(use):
+    use("a")
+    db.add_entry("2026-10-01", "Acme", 2, "Review")
+    send(use, "a", "b")
+
+
+def test_later_edit_wins_on_both_sides(sites, monkeypatch):
+    _shared_entry(sites)
+    monkeypatch.setattr(db, "utc_now", lambda: "2026-10-02T10:00:00.000Z")
+    _edit(sites, "a", "Edited on a")
+    monkeypatch.setattr(db, "utc_now", lambda: "2026-10-02T11:00:00.000Z")
+    _edit(sites, "b", "Edited on b")
+    _exchange(sites)
+    assert _log(sites, "a") == _log(sites, "b") == [("Acme", 2.0, "Edited on b")]
+
+
+def test_tied_edits_settle_on_the_same_version(sites, monkeypatch):
+    _shared_entry(sites)
+    monkeypatch.setattr(db, "utc_now", lambda: "2026-10-02T10:00:00.000Z")
+    _edit(sites, "a", "Edited on a")
+    _edit(sites, "b", "Edited on b")
+    _exchange(sites)
+    assert _log(sites, "a") == _log(sites, "b")
+    assert len(_log(sites, "a")) == 1
+
+
+def test_delete_wins_over_an_older_edit(sites, monkeypatch):
+    _shared_entry(sites)
+    monkeypatch.setattr(db, "utc_now", lambda: "2026-10-02T10:00:00.000Z")
+    _edit(sites, "a", "Edited on a")
+    sites("b")
+    db.delete_entry(db.get_entries()[0]["id"])  # stamped now, after the edit
+    _exchange(sites)
+    assert _log(sites, "a") == _log(sites, "b") == []
+
+
+def test_edit_after_a_delete_is_kept(sites, monkeypatch):
+    _shared_entry(sites)
+    sites("b")
+    db.delete_entry(db.get_entries()[0]["id"])
+    monkeypatch.setattr(db, "utc_now", lambda: "2999-01-01T00:00:00.000Z")
+    _edit(sites, "a", "Edited on a")
+    counts, _ = send(sites, "b", "a")
+    assert counts["skipped"] == 1
+    assert _log(sites, "a") == [("Acme", 2.0, "Edited on a")]
+
+
+def test_tombstone_blocks_a_stale_reinsert(sites):
+    _shared_entry(sites)
+    sites("b")
+    db.delete_entry(db.get_entries()[0]["id"])
+    counts, _ = send(sites, "a", "b")  # "a" still has the old version
+    assert (counts["inserted"], counts["skipped"]) == (0, 1)
+    assert _log(sites, "b") == []
+
+
+def test_applying_a_delta_twice_changes_nothing(sites):
+    sites("a")
+    db.import_entries([_entry(), _entry(description="Standup")])
+    db.add_entry("2026-10-03", "Beta", 1, "Deleted later")
+    db.delete_entry(db.get_entries()[0]["id"])
+    first, _ = send(sites, "a", "b")
+    log = _log(sites, "b")
+    sites("b")
+    seq = db.get_change_seq()
+    second, _ = send(sites, "a", "b")
+    assert first["inserted"] == 2
+    assert second["skipped"] == sum(second.values())
+    assert _log(sites, "b") == log
+    sites("b")
+    assert db.get_change_seq() == seq
+
+
+def test_received_changes_are_not_sent_back(sites):
+    sites("a")
+    db.import_entries([_entry(), _entry(description="Standup")])
+    sites("b")
+    db.import_entries([_entry()])  # the same history, imported separately
+    counts, _ = send(sites, "a", "b")
+    assert (counts["matched"], counts["inserted"]) == (1, 1)
+    assert _log(sites, "b") == _log(sites, "a")
+    counts, _ = send(sites, "b", "a")
+    assert sum(counts.values()) == 0
+
+
+def test_invalid_entries_are_not_saved(sites):
+    sites("b")
+    changes = [
+        {"op": "upsert", "uid": "u1", "updated_at": "2026-10-01T00:00:00.000Z", "date": "20261001",
+         "customer": "Acme", "hours": 1, "description": "Review"},
+        {"op": "upsert", "uid": "u2", "updated_at": "2026-10-01T00:00:00.000Z",
+         "date": "2026-10-01", "customer": "Acme", "hours": -1, "description": "Review"},
+        {"op": "upsert", "uid": "u3", "updated_at": "2026-10-01T00:00:00.000Z",
+         "date": "2026-10-01", "customer": " ", "hours": 1, "description": "Review"},
+    ]
+    assert db.apply_changes(changes)["invalid"] == 3
+    assert db.get_entries() == []
+    assert db.get_customers() == []
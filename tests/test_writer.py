@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from minelogger import db
+from minelogger.writer import Writer, WriterStopped
+
+
+@pytest.fixture
+def writer(temp_db):
+    writer = db.start_writer()
+    yield writer
+    db.stop_writer()
+
+
+def test_writes_go_through_the_writer(writer):
+    db.add_entry("2026-10-01", "Acme", 2, "Review")
+    assert writer.operations == 1
+    assert len(db.get_entries()) == 1
+
+
+def test_submit_after_stop_fails(temp_db):
+    writer = Writer()
+    writer.start()
+    writer.stop()
+    with pytest.raises(WriterStopped):
+        writer.submit(db.add_entry, ("2026-10-01", "Acme", 2, "Review"))
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_pending_writes_fail_when_the_thread_dies(temp_db, monkeypatch):
+    writer = Writer()
+    entered, release = threading.Event(), threading.Event()
+
+    def crashing_apply(conn, batch):
+        entered.set()
+        release.wait()
+        raise RuntimeError("crash")  # ends the thread without answering the batch
+
+    monkeypatch.setattr(writer, "_apply", crashing_apply)
+    writer.start()
+    errors = []
+
+    def submit():
+        try:
+            writer.submit(len, ((),))
+        except WriterStopped as exc:
+            errors.append(exc)
+
+    callers = [threading.Thread(target=submit) for _ in range(2)]
+    callers[0].start()
+    entered.wait()  # the first call is being applied, the second one queues
+    callers[1].start()
+    while writer._queue.empty():
+        time.sleep(0.001)
+    release.set()
+    for caller in callers:
+        caller.join(5)
+        assert not caller.is_alive()
+    writer._thread.join(5)  # let the crash be reported within this test
+    assert len(errors) == 2
+    with pytest.raises(WriterStopped):
+        writer.submit(len, ((),))
+
+
+def test_import_parses_on_the_callers_thread(writer):
+    readers = set()
+
+    def rows():
+        for i in range(25):
+            readers.add(threading.current_thread())
+            yield {"date": "2026-10-01", "customer": "Acme", "hours": 1, "description": f"Task {i % 20}"}
+
+    assert db.import_entries(rows(), batch_size=10) == (20, 5)
+    assert readers == {threading.current_thread()}
+    assert writer.operations == 4  # three batches staged, then one insert